@@ -7,16 +7,53 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_session import Session
+from jinja2 import FileSystemBytecodeCache
 
 try:
     import redis  # type: ignore
 except Exception:  # pragma: no cover - optional dependency
     redis = None  # type: ignore
 
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore
+
 logger = logging.getLogger(__name__)
 
 
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by ``orjson`` for the API and ``jsonify`` paths.
+
+    Datetimes are passed through to Flask's default handler so responses keep
+    the same HTTP-date format. ``response()`` always asks for either compact
+    separators or ``indent=2``, which map onto orjson's own output; any other
+    stdlib-only option falls back to the default provider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get("indent") == 2:
+            option |= orjson.OPT_INDENT_2
+        unsupported = {
+            key: value
+            for key, value in kwargs.items()
+            if not (key == "indent" and value == 2) and not (key == "separators" and tuple(value) == (",", ":"))
+        }
+        if unsupported:
+            return super().dumps(obj, **kwargs)
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
 def _resolve_secret_key() -> str:
     """Return a secret key for Flask sessions.
 
@@ -65,21 +102,45 @@ def _resolve_database_uri(app: Flask) -> str:
     return f"sqlite:///{default_sqlite_path}"
 
 
+def _skip_unmodified_session_saves(app: Flask) -> None:
+    """Only persist server-side sessions when ``should_set_cookie`` says so.
+
+    Flask-Session 0.5 rewrites the stored session and re-sends the cookie on
+    every response, ignoring ``SESSION_REFRESH_EACH_REQUEST``. Wrapping its
+    ``save_session`` restores Flask's rule so untouched sessions cost nothing.
+    """
+
+    interface = app.session_interface
+    save_session = interface.save_session
+
+    def _save_session(app, session, response):
+        if session and not interface.should_set_cookie(app, session):
+            return
+        save_session(app, session, response)
+
+    interface.save_session = _save_session
+
+
 def create_app() -> Flask:
     """Configure and return the Flask application."""
 
     load_dotenv()
 
     app = Flask(__name__)
+    if orjson is not None:
+        app.json = ORJSONProvider(app)
 
     # Services discover their own credentials from the environment so the app
     # can run in environments where optional integrations (e.g. Supabase,
     # Gemini) are not configured.
-    from .routes import ai_service, health_ingestion, storage_service
+    from .routes import ai_service, health_ingestion, storage_service, visualization_worker
 
     app.storage_service = storage_service
     app.ai_service = ai_service
     app.health_ingestion = health_ingestion
+    # A serverless process is frozen once the response is sent, so queued
+    # visualization jobs would never run; generate them inline there instead.
+    app.visualization_worker = None if _running_on_vercel() else visualization_worker
 
     app.config["SECRET_KEY"] = _resolve_secret_key()
     app.config["ASSET_VERSION"] = os.environ.get("ASSET_VERSION", "1")
@@ -105,9 +166,22 @@ def create_app() -> Flask:
         app.config["SESSION_TYPE"] = "filesystem"
         app.config["SESSION_FILE_DIR"] = str(session_dir)
 
+    # Sessions are permanent by default under Flask-Session; only write them
+    # back when they actually change.
+    app.config["SESSION_REFRESH_EACH_REQUEST"] = False
+
     app.config["SQLALCHEMY_DATABASE_URI"] = _resolve_database_uri(app)
 
     Session(app)
+    _skip_unmodified_session_saves(app)
+
+    # Share compiled template bytecode across workers and cold starts.
+    jinja_cache_dir = Path(os.environ.get("JINJA_CACHE_DIR", "/tmp/jinja_bcc"))
+    try:
+        jinja_cache_dir.mkdir(parents=True, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(jinja_cache_dir))
+    except OSError:
+        logger.warning("Jinja bytecode cache unavailable; compiling templates in memory", exc_info=True)
 
     from .routes import main_bp
 
@@ -118,4 +192,10 @@ def create_app() -> Flask:
     except Exception:
         logger.warning("health_ingestion.start_failed", exc_info=True)
 
+    if app.visualization_worker is not None:
+        try:
+            app.visualization_worker.start_background_tasks()
+        except Exception:
+            logger.warning("visualization_worker.start_failed", exc_info=True)
+
     return app
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
-import base64
 import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta, timezone
-from functools import wraps
+from functools import lru_cache
 import logging
 from pathlib import Path
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from uuid import uuid4
 
 from flask import (
@@ -16,28 +17,57 @@ from flask import (
     Response,
     abort,
     flash,
+    jsonify,
+    make_response,
     redirect,
     render_template,
     request,
     session,
     send_from_directory,
     url_for,
-    current_app
+    current_app,
+    g,
 )
 from werkzeug.utils import secure_filename
 
 from .services.ai_service import AIService
 from .services.health_ingestion import HealthDataIngestion
 from .services.storage_service import StorageService
+from .services.visualization_worker import VisualizationWorker
 
 main_bp = Blueprint('main', __name__)
 
 ai_service = AIService()
 storage_service = StorageService()
 health_ingestion = HealthDataIngestion(storage_service, ai_service)
+visualization_worker = VisualizationWorker(storage_service, ai_service)
 
 logger = logging.getLogger(__name__)
 
+# Visualization filenames embed a random uuid, so a given URL never changes
+# content and browsers can keep it for a year.
+_IMAGE_MAX_AGE = 31536000
+_ALLOWED_IMAGE_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'webp'})
+_VISUALIZATION_VARIANTS = frozenset({'original', 'future'})
+# A visualization still pending after this long lost its job (e.g. a worker
+# restart dropped the in-memory queue) and is reported as failed.
+_VISUALIZATION_PENDING_TIMEOUT = timedelta(minutes=10)
+
+# Weekly dashboard goals; all non-zero, so completion needs no zero guard.
+_WEEKLY_WORKOUT_GOAL = 5
+_WEEKLY_MEAL_GOAL = 14
+_WEEKLY_SLEEP_GOAL_HOURS = 49  # 7 nights * 7 hours
+
+# Coach replies only see this many of the latest messages (10 exchanges), so
+# prompt size and model cost stay flat as the chat history grows.
+_COACH_CONTEXT_MESSAGES = 20
+# Older messages are folded into a rolling summary, refreshed once this many
+# more have aged out of the window.
+_HISTORY_SUMMARY_REFRESH = 10
+
+# First unsigned decimal in free-text fields such as "7.5h" or "30 min".
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
 
 @main_bp.route('/service-worker.js')
 def service_worker() -> Response:
@@ -48,24 +78,59 @@ def service_worker() -> Response:
     return response
 
 
-def _require_login() -> str | None:
-    if 'user' not in session:
-        flash('Please log in to continue.', 'warning')
-        return url_for('main.login')
-    return None
+def _render_cached(fingerprint: Any, template: str, **context: Any) -> Response:
+    """Render ``template`` unless the client already holds this exact page.
+
+    ``fingerprint`` must cover everything the page shows beyond the session
+    user, which is folded in here. Pending flash messages always force a
+    full render so they are not lost behind a 304.
+    """
+
+    digest_source = repr((session.get('user'), current_app.config.get('ASSET_VERSION'), fingerprint))
+    etag = hashlib.blake2b(digest_source.encode(), digest_size=16).hexdigest()
+    if '_flashes' not in session and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(render_template(template, **context))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = 0
+    return response
+
+
+def _send_image(directory: Path, filename: str) -> Response:
+    """Serve an immutable user image with conditional and long-lived cache headers."""
+
+    response = send_from_directory(directory, filename, conditional=True, max_age=_IMAGE_MAX_AGE)
+    response.headers['Cache-Control'] = f'private, max-age={_IMAGE_MAX_AGE}, immutable'
+    return response
+
 
+# Endpoints reachable without a logged-in user; everything else on the
+# blueprint is guarded by ``_require_login``.
+_PUBLIC_ENDPOINTS = frozenset({
+    'main.service_worker',
+    'main.index',
+    'main.offline',
+    'main.signup',
+    'main.login',
+    'main.logout',
+    'main.verify_email_status',
+})
+# Polled by client scripts, which expect JSON rather than a login redirect.
+_JSON_AUTH_ENDPOINTS = frozenset({'main.weekly_prompt', 'main.daily_calories', 'main.visualization_status'})
 
-def login_required(view):
-    """Decorator ensuring the user is authenticated before accessing a view."""
 
-    @wraps(view)
-    def wrapped(*args, **kwargs):
-        redirect_url = _require_login()
-        if redirect_url:
-            return redirect(redirect_url)
-        return view(*args, **kwargs)
+@main_bp.before_request
+def _require_login() -> Optional[Response]:
+    """Enforce authentication once for every protected blueprint endpoint."""
 
-    return wrapped
+    if 'user' in session or request.endpoint is None or request.endpoint in _PUBLIC_ENDPOINTS:
+        return None
+    if request.endpoint in _JSON_AUTH_ENDPOINTS:
+        return {'error': 'Unauthorized'}, 401
+    flash('Please log in to continue.', 'warning')
+    return redirect(url_for('main.login'))
 
 
 def _extract_email_confirmed(candidate: Any) -> Any:
@@ -128,6 +193,13 @@ def _onboarding_complete() -> bool:
         return False
 
     status = user.get('onboarding_complete')
+    if status:
+        return True
+    # A negative answer costs storage lookups, so remember it for the rest of
+    # the request. Completing onboarding flips the session flag checked above.
+    if g.get('onboarding_incomplete_user') == user['id']:
+        return False
+
     if status is None:
         stored = current_app.storage_service.get_onboarding_status(user['id'])
         if stored is not None:
@@ -138,14 +210,18 @@ def _onboarding_complete() -> bool:
         else:
             status = False
 
-    if not status:
-        plan = current_app.storage_service.fetch_plan(user['id'])
-        if plan:
-            user['onboarding_complete'] = True
-            session['user'] = user
-            session.modified = True
-            return True
-    return bool(status)
+    if status:
+        return True
+
+    plan = current_app.storage_service.fetch_plan(user['id'])
+    if plan:
+        user['onboarding_complete'] = True
+        session['user'] = user
+        session.modified = True
+        return True
+
+    g.onboarding_incomplete_user = user['id']
+    return False
 
 
 def _ensure_onboarding_complete() -> Optional[Response]:
@@ -155,6 +231,48 @@ def _ensure_onboarding_complete() -> Optional[Response]:
     return None
 
 
+def _compact_history(conversation: List[Dict[str, str]], summary: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Return the coach context: the stored summary of older turns plus the latest ones.
+
+    No model call happens here; ``_refresh_history_summary`` rolls the summary
+    forward once the reply has been sent.
+    """
+
+    recent = conversation[-_COACH_CONTEXT_MESSAGES:]
+    older_count = len(conversation) - len(recent)
+    if older_count <= 0 or not summary.get('summary') or summary.get('turns', 0) > older_count:
+        return recent
+
+    return [{'role': 'assistant', 'content': f"Earlier in our chat: {summary['summary']}"}, *recent]
+
+
+def _refresh_history_summary(
+    ai: AIService,
+    storage: StorageService,
+    user_id: str,
+    conversation: List[Dict[str, str]],
+    summary: Dict[str, Any],
+) -> None:
+    """Fold messages that left the coach window into the stored summary.
+
+    The summary is only regenerated after ``_HISTORY_SUMMARY_REFRESH`` more
+    messages have aged out, so long chats cost the same per turn as short ones.
+    """
+
+    older_count = len(conversation) - _COACH_CONTEXT_MESSAGES
+    if older_count <= 0:
+        return
+
+    summarized = summary.get('turns', 0)
+    if summarized > older_count:
+        summary, summarized = {}, 0
+    if summary and older_count - summarized < _HISTORY_SUMMARY_REFRESH:
+        return
+
+    rolled = ai.roll_summary(summary.get('summary', ''), conversation[summarized:older_count])
+    storage.save_coach_summary(user_id, {'turns': older_count, 'summary': rolled})
+
+
 @main_bp.route('/')
 def index() -> str:
     return render_template('index.html')
@@ -322,15 +440,18 @@ def _parse_sleep_hours(value: Any) -> float:
     if isinstance(value, (int, float)):
         return float(value)
     if isinstance(value, str):
-        match = re.search(r"([0-9]+(?:\.[0-9]+)?)", value)
+        match = _NUMBER_RE.search(value)
         if match:
-            try:
-                return float(match.group(1))
-            except ValueError:
-                return 0.0
+            return float(match.group(0))
     return 0.0
 
 
+def _completion_pct(value: float, goal: int) -> int:
+    """Percentage of a non-zero weekly goal, floored and capped at 100."""
+
+    return min(100, int(value * 100 // goal))
+
+
 def _derive_dashboard_stats(user_id: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]: # noqa: E501
     """Return summarized metrics and a lightweight activity trend.
 
@@ -339,10 +460,9 @@ def _derive_dashboard_stats(user_id: str) -> Tuple[Dict[str, Any], List[Dict[str
 
     today = datetime.now(timezone.utc).date()
     start_of_week = today - timedelta(days=today.weekday())
-    recent_days = [start_of_week + timedelta(days=offset) for offset in range(0, 7)]
     day_buckets: Dict[str, Dict[str, float]] = {
-        day.isoformat(): {'meals': 0, 'workouts': 0, 'sleep_hours': 0.0}
-        for day in recent_days
+        (start_of_week + timedelta(days=offset)).isoformat(): {'meals': 0, 'workouts': 0, 'sleep_hours': 0.0}
+        for offset in range(7)
     }
 
     meals = current_app.storage_service.list_normalized_records('meals', user_id)
@@ -350,17 +470,21 @@ def _derive_dashboard_stats(user_id: str) -> Tuple[Dict[str, Any], List[Dict[str
     sleep_entries = current_app.storage_service.list_normalized_records('sleep', user_id)
 
     calories_total = 0.0
+    meal_count = workout_count = habit_count = 0
+    sleep_hours_total = 0.0
 
     for meal in meals:
         date_key = meal.get('date_inferred')
         if date_key in day_buckets:
             day_buckets[date_key]['meals'] += 1
+            meal_count += 1
             calories_total += meal.get('calories', 0.0) or 0.0
 
     for workout in workouts:
         date_key = workout.get('date_inferred')
         if date_key in day_buckets:
             day_buckets[date_key]['workouts'] += 1
+            workout_count += 1
 
     for sleep_entry in sleep_entries:
         date_key = sleep_entry.get('date_inferred')
@@ -368,36 +492,26 @@ def _derive_dashboard_stats(user_id: str) -> Tuple[Dict[str, Any], List[Dict[str
         if date_key in day_buckets and time_asleep:
             hours = _parse_sleep_hours(time_asleep)
             day_buckets[date_key]['sleep_hours'] += hours
+            sleep_hours_total += hours
 
-    totals = {
-        'workouts': sum(bucket['workouts'] for bucket in day_buckets.values()),
-        'meals': sum(bucket['meals'] for bucket in day_buckets.values()),
-        'sleep_hours': sum(bucket['sleep_hours'] for bucket in day_buckets.values()),
-        'habits': 0,
-    }
-
-    trend: List[Dict[str, Any]] = []
-    for day in recent_days:
-        key = day.isoformat()
-        bucket = day_buckets[key]
-        intensity = bucket['meals'] + bucket['workouts'] + bucket['sleep_hours']
-        trend.append({'label': key, 'value': intensity})
+    # day_buckets preserves the Monday-to-Sunday insertion order.
+    trend: List[Dict[str, Any]] = [
+        {'label': key, 'value': bucket['meals'] + bucket['workouts'] + bucket['sleep_hours']}
+        for key, bucket in day_buckets.items()
+    ]
 
-    workout_goal = 5
-    meal_goal = 14
-    sleep_goal = 49  # 7 nights * 7 hours
 
     stats = {
-        'total_workouts': int(totals['workouts']),
-        'total_meals': int(totals['meals']),
-        'total_habits': totals['habits'],
-        'hours_sleep': round(totals['sleep_hours'], 1),
+        'total_workouts': workout_count,
+        'total_meals': meal_count,
+        'total_habits': habit_count,
+        'hours_sleep': round(sleep_hours_total, 1),
         'calories_estimate': calories_total,
-        'calories_burned': int(totals['workouts'] * 320),
-        'workout_completion': min(100, int((totals['workouts'] / workout_goal) * 100)) if workout_goal else 0,
-        'meal_completion': min(100, int((totals['meals'] / meal_goal) * 100)) if meal_goal else 0,
-        'sleep_completion': min(100, int((totals['sleep_hours'] / sleep_goal) * 100)) if sleep_goal else 0,
-        'has_data': any(value for bucket in day_buckets.values() for value in bucket.values()),
+        'calories_burned': workout_count * 320,
+        'workout_completion': _completion_pct(workout_count, _WEEKLY_WORKOUT_GOAL),
+        'meal_completion': _completion_pct(meal_count, _WEEKLY_MEAL_GOAL),
+        'sleep_completion': _completion_pct(sleep_hours_total, _WEEKLY_SLEEP_GOAL_HOURS),
+        'has_data': bool(meal_count or workout_count or sleep_hours_total),
     }
 
     return stats, trend
@@ -414,21 +528,32 @@ def _parse_date_only(value: Any) -> Optional[date]:
         return value.date()
 
     if isinstance(value, str):
-        text = value.strip()
-        if not text:
-            return None
-        if text.endswith('Z'):
-            text = text[:-1] + '+00:00'
+        return _parse_date_text(value.strip())
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _parse_date_text(text: str) -> Optional[date]:
+    """Parse an ISO date or timestamp string.
+
+    Chart endpoints parse every record's date on each call and the same few
+    days repeat across records and requests, so results are memoized; ``date``
+    objects are immutable and safe to share.
+    """
+
+    if not text:
+        return None
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        if 'T' in text:
+            text = text.split('T', 1)[0]
         try:
-            return datetime.fromisoformat(text).date()
+            return datetime.strptime(text, '%Y-%m-%d').date()
         except ValueError:
-            if 'T' in text:
-                text = text.split('T', 1)[0]
-            try:
-                return datetime.strptime(text, '%Y-%m-%d').date()
-            except ValueError:
-                return None
-    return None
+            return None
 
 
 def _month_shift(base: date, offset_months: int) -> date:
@@ -484,7 +609,9 @@ def _bucketize(entries: List[Dict[str, Any]], buckets: List[Dict[str, Any]], val
 
 
 def _parse_float(value: Any) -> float:
-    match = re.search(r'\d+(?:\.\d+)?', str(value or ''))
+    if not isinstance(value, str):
+        value = str(value or '')
+    match = _NUMBER_RE.search(value)
     return float(match.group(0)) if match else 0.0
 
 
@@ -570,19 +697,23 @@ def _aggregate_trend_series(range_key: str, user_id: str, storage: StorageServic
     }
 
 
+def _sleep_entry_hours(entry: Dict[str, Any]) -> float:
+    hours = _parse_float(entry.get('time_asleep'))
+    if hours:
+        return hours
+    metadata = entry.get('metadata')
+    if not metadata:
+        return 0.0
+    return _parse_float(metadata.get('hours')) or _parse_float(metadata.get('time_asleep'))
+
+
 def _build_dashboard_range_data(range_key: str, user_id: str, storage: StorageService) -> Dict[str, Any]:
     buckets = _chart_buckets(range_key)
     meals = storage.list_normalized_records('meals', user_id)
     workouts = storage.list_normalized_records('workouts', user_id)
     sleep_entries = storage.list_normalized_records('sleep', user_id)
 
-    sleep_hours = _bucketize(
-        sleep_entries,
-        buckets,
-        lambda entry: _parse_float(entry.get('time_asleep'))
-        or _parse_float((entry.get('metadata') or {}).get('hours'))
-        or _parse_float((entry.get('metadata') or {}).get('time_asleep')),
-    )
+    sleep_hours = _bucketize(sleep_entries, buckets, _sleep_entry_hours)
 
     return {
         'labels': [bucket['label'] for bucket in buckets],
@@ -594,18 +725,13 @@ def _build_dashboard_range_data(range_key: str, user_id: str, storage: StorageSe
 
 @main_bp.route('/dashboard')
 def dashboard() -> str | Response:
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     onboarding_redirect = _ensure_onboarding_complete()
     if onboarding_redirect:
         return onboarding_redirect
 
     user = session['user']
-    plan = current_app.storage_service.fetch_plan(user['id'])
-    logs = current_app.storage_service.fetch_logs(user['id'])
-    weekly_prompt = current_app.storage_service.get_weekly_prompt(user['id'])
+    bundle = current_app.storage_service.fetch_dashboard_bundle(user['id'])
+    plan, logs, weekly_prompt = bundle['plan'], bundle['logs'], bundle['weekly_prompt']
 
     supabase_config = StorageService.supabase_client_config()
 
@@ -614,9 +740,11 @@ def dashboard() -> str | Response:
 
     # Create a version of logs compatible with templates expecting flat data
     template_logs = _create_template_compatible_logs(logs)
-    recent_logs = list(reversed(template_logs[-3:])) if template_logs else []
+    recent_logs = template_logs[:-4:-1]
 
-    return render_template(
+    fingerprint = (plan, len(logs), logs[-1] if logs else None, weekly_prompt, stats, trend, supabase_config)
+    return _render_cached(
+        fingerprint,
         'dashboard.html',
         plan=plan,
         logs=template_logs,
@@ -630,51 +758,73 @@ def dashboard() -> str | Response:
 
 @main_bp.route('/onboarding', methods=['GET', 'POST'])
 def onboarding() -> str | Response:
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     if _onboarding_complete():
         flash('Onboarding is complete. Jump into your AI coach anytime.', 'info')
         return redirect(url_for('main.ai_coach'))
 
-    user_id = session['user']['id']
+    user = session['user']
+    user_id = user['id']
     conversation: List[Dict[str, str]] = session.get('onboarding_conversation')
+    conversation_changed = conversation is None
     if conversation is None:
         conversation = current_app.storage_service.fetch_conversation(user_id)
-        session['onboarding_conversation'] = conversation
-        session.modified = True
 
     if request.method == 'POST':
         user_message = request.form['message']
         conversation.append({'role': 'user', 'content': user_message})
 
-        ai_message = current_app.ai_service.continue_onboarding(conversation, session['user'])
+        ai_message = current_app.ai_service.continue_onboarding(conversation, user)
         conversation.append({'role': 'assistant', 'content': ai_message})
-        session['onboarding_conversation'] = conversation
-        session.modified = True
-
+        conversation_changed = True
         current_app.storage_service.save_conversation(user_id, conversation)
 
         if request.form.get('complete'):
-            plan = current_app.ai_service.generate_plan(conversation, session['user'])
-            current_app.storage_service.save_plan(session['user']['id'], plan)
+            plan = current_app.ai_service.generate_plan(conversation, user)
+            current_app.storage_service.save_plan(user_id, plan)
             session.pop('onboarding_conversation', None)
             current_app.storage_service.set_onboarding_complete(user_id, True)
-            session['user']['onboarding_complete'] = True
+            user['onboarding_complete'] = True
             session.modified = True
             flash('Your personalized plan is ready!', 'success')
             return redirect(url_for('main.dashboard'))
 
+    if conversation_changed:
+        session['onboarding_conversation'] = conversation
+        session.modified = True
+
     return render_template('onboarding.html', conversation=conversation)
 
 
+@main_bp.route('/onboarding/stream', methods=['POST'])
+def onboarding_stream() -> Response:
+    """Stream the next onboarding question as server-sent events while it is generated."""
+
+    if _onboarding_complete():
+        return redirect(url_for('main.ai_coach'))
+
+    user = session['user']
+    user_id = user['id']
+    user_message = (request.form.get('message') or '').strip()
+    if not user_message:
+        abort(400)
+
+    storage = current_app.storage_service
+    conversation: List[Dict[str, str]] = session.get('onboarding_conversation')
+    if conversation is None:
+        conversation = storage.fetch_conversation(user_id)
+    conversation.append({'role': 'user', 'content': user_message})
+    storage.save_conversation(user_id, conversation)
+    chunks = current_app.ai_service.stream_continue_onboarding(conversation, user)
+
+    def save(reply: str) -> None:
+        _append_stored_reply(storage.fetch_conversation, storage.save_conversation, user_id, reply)
+
+    session.pop('onboarding_conversation', None)
+    return _stream_reply(chunks, save)
+
+
 @main_bp.route('/coach', methods=['GET', 'POST'])
 def ai_coach() -> str | Response:
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     onboarding_redirect = _ensure_onboarding_complete()
     if onboarding_redirect:
         return onboarding_redirect
@@ -682,34 +832,129 @@ def ai_coach() -> str | Response:
     user = session['user']
     user_id = user['id']
     conversation: List[Dict[str, str]] = session.get('coach_conversation')
+    conversation_changed = conversation is None
     if conversation is None:
         conversation = current_app.storage_service.fetch_coach_conversation(user_id)
-        session['coach_conversation'] = conversation
-        session.modified = True
 
     if request.method == 'POST':
         user_message = request.form['message']
         conversation.append({'role': 'user', 'content': user_message})
 
+        # The full history is persisted below; the model only needs the recent turns.
+        history_summary = current_app.storage_service.fetch_coach_summary(user_id)
+        recent_turns = _compact_history(conversation, history_summary)
         if _onboarding_complete():
-            ai_message = current_app.ai_service.check_in(conversation, user)
+            ai_message = current_app.ai_service.check_in(recent_turns, user)
         else:
-            ai_message = current_app.ai_service.continue_onboarding(conversation, user)
+            ai_message = current_app.ai_service.continue_onboarding(recent_turns, user)
         conversation.append({'role': 'assistant', 'content': ai_message})
-        session['coach_conversation'] = conversation
-        session.modified = True
+        conversation_changed = True
 
         current_app.storage_service.save_coach_conversation(user_id, conversation)
+        _refresh_history_summary(
+            current_app.ai_service, current_app.storage_service, user_id, conversation, history_summary
+        )
+
+    if conversation_changed:
+        session['coach_conversation'] = conversation
+        session.modified = True
 
     return render_template('ai_coach.html', conversation=conversation)
 
 
+@main_bp.route('/coach/stream', methods=['POST'])
+def ai_coach_stream() -> Response:
+    """Stream the coach's reply as server-sent events while it is generated."""
+
+    onboarding_redirect = _ensure_onboarding_complete()
+    if onboarding_redirect:
+        return onboarding_redirect
+
+    user = session['user']
+    user_id = user['id']
+    user_message = (request.form.get('message') or '').strip()
+    if not user_message:
+        abort(400)
+
+    storage = current_app.storage_service
+    ai = current_app.ai_service
+    conversation: List[Dict[str, str]] = session.get('coach_conversation')
+    if conversation is None:
+        conversation = storage.fetch_coach_conversation(user_id)
+    conversation.append({'role': 'user', 'content': user_message})
+    storage.save_coach_conversation(user_id, conversation)
+    history_summary = storage.fetch_coach_summary(user_id)
+    recent_turns = _compact_history(conversation, history_summary)
+    if _onboarding_complete():
+        chunks = ai.stream_check_in(recent_turns, user)
+    else:
+        chunks = ai.stream_continue_onboarding(recent_turns, user)
+
+    def save(reply: str) -> None:
+        finished = _append_stored_reply(
+            storage.fetch_coach_conversation, storage.save_coach_conversation, user_id, reply
+        )
+        # The reply has already been sent, so the summary model call costs the user nothing.
+        _refresh_history_summary(ai, storage, user_id, finished, history_summary)
+
+    session.pop('coach_conversation', None)
+    return _stream_reply(chunks, save)
+
+
+def _stream_reply(chunks: Iterable[str], save: Callable[[str], None]) -> Response:
+    """Send reply chunks as server-sent events, then hand the finished reply to ``save``.
+
+    The session is written before the body streams, so callers persist the
+    user's turn up front, drop their cached copy of the conversation and let
+    the next page load read it from storage. A reply that fails part-way ends
+    with an ``error`` event and is saved as empty, so only complete replies
+    are stored.
+    """
+
+    def generate():
+        parts: List[str] = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception:
+            # The client already has part of the reply; tell it the reply broke
+            # off instead of saving the fragment as a finished turn.
+            logger.warning('stream_reply.interrupted', exc_info=True)
+            parts = []
+            yield "event: error\ndata: {}\n\n"
+        finally:
+            save(''.join(parts).strip())
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def _append_stored_reply(
+    fetch: Callable[[str], List[Dict[str, str]]],
+    save: Callable[[str, List[Dict[str, str]]], None],
+    user_id: str,
+    reply: str,
+) -> List[Dict[str, str]]:
+    """Append a streamed reply to the latest stored conversation and return it.
+
+    The conversation is re-read rather than reused from the start of the
+    request, so turns saved by an overlapping stream are kept.
+    """
+
+    conversation = fetch(user_id)
+    if reply:
+        conversation.append({'role': 'assistant', 'content': reply})
+        save(user_id, conversation)
+    return conversation
+
+
 @main_bp.route('/plan')
 def plan() -> str | Response:
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     onboarding_redirect = _ensure_onboarding_complete()
     if onboarding_redirect:
         return onboarding_redirect
@@ -721,15 +966,11 @@ def plan() -> str | Response:
             return redirect(url_for('main.ai_coach'))
         return redirect(url_for('main.onboarding'))
 
-    return render_template('plan.html', plan=plan)
+    return _render_cached(plan, 'plan.html', plan=plan)
 
 
 @main_bp.route('/progress', methods=['GET', 'POST'])
 def progress() -> str | Response:
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     onboarding_redirect = _ensure_onboarding_complete()
     if onboarding_redirect:
         return onboarding_redirect
@@ -746,14 +987,30 @@ def progress() -> str | Response:
             flash("Please fill out at least one section to log your progress.", 'warning')
             return redirect(url_for('main.progress'))
 
+        now = datetime.now(timezone.utc)
         # This dictionary will hold the new, individual entries to be added to the daily log.
         new_entries: Dict[str, Any] = {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': now.isoformat(),
         }
 
         # Generate a unique integer ID using the current timestamp in microseconds.
         # This will serve as the base for multiple entries in the same request.
-        unique_id_counter = int(datetime.now(timezone.utc).timestamp() * 1_000_000)
+        unique_id_counter = int(now.timestamp() * 1_000_000)
+
+        # Each section is interpreted by its own model call; run them side by
+        # side so the request waits for the slowest one rather than the sum.
+        ai = current_app.ai_service
+        interpreters = {
+            'meals': (meals, ai.estimate_meal_calories),
+            'workout': (workout, ai.interpret_workout_log),
+            'sleep': (sleep, ai.interpret_sleep_log),
+        }
+        with ThreadPoolExecutor(max_workers=len(interpreters)) as executor:
+            pending = {
+                section: executor.submit(interpret, text)
+                for section, (text, interpret) in interpreters.items()
+                if text
+            }
 
         if meals:
             meal_entry: Dict[str, Any] = {
@@ -763,7 +1020,7 @@ def progress() -> str | Response:
                 'llm_method': 'meal_estimation_v1',
             }
             try:
-                estimation = current_app.ai_service.estimate_meal_calories(meals)
+                estimation = pending['meals'].result()
                 if estimation:
                     meal_entry.update(estimation)
                 else:
@@ -787,7 +1044,7 @@ def progress() -> str | Response:
                 'timestamp': new_entries['timestamp'],
             }
             try:
-                interpretation = current_app.ai_service.interpret_workout_log(workout)
+                interpretation = pending['workout'].result()
                 if interpretation:
                     workout_entry.update(interpretation)
             except Exception:
@@ -802,7 +1059,7 @@ def progress() -> str | Response:
                 'timestamp': new_entries['timestamp'],
             }
             try:
-                interpretation = current_app.ai_service.interpret_sleep_log(sleep)
+                interpretation = pending['sleep'].result()
                 if interpretation:
                     sleep_entry.update(interpretation)
             except Exception:
@@ -831,19 +1088,22 @@ def progress() -> str | Response:
 
 @main_bp.route('/replan', methods=['POST'])
 def replan() -> Response:
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     onboarding_redirect = _ensure_onboarding_complete()
     if onboarding_redirect:
         return onboarding_redirect
 
     user = session['user']
     user_id = user['id']
-    plan = current_app.storage_service.fetch_plan(user_id)
-    logs = current_app.storage_service.fetch_logs(user_id)
-    conversation = current_app.storage_service.fetch_conversation(user_id)
+    storage = current_app.storage_service
+    # The three reads are independent round trips to the backing store; issue
+    # them together so the refresh waits for the slowest one, not their sum.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        plan_future = executor.submit(storage.fetch_plan, user_id)
+        logs_future = executor.submit(storage.fetch_logs, user_id)
+        conversation_future = executor.submit(storage.fetch_conversation, user_id)
+    plan = plan_future.result()
+    logs = logs_future.result()
+    conversation = conversation_future.result()
 
     updated_plan = current_app.ai_service.regenerate_plan(plan, logs, conversation, user)
     current_app.storage_service.save_plan(user_id, updated_plan)
@@ -852,20 +1112,18 @@ def replan() -> Response:
 
 
 @main_bp.route('/api/weekly_prompt')
-def weekly_prompt() -> Dict[str, Any]:
-    redirect_url = _require_login()
-    if redirect_url:
-        return {'error': 'Unauthorized'}, 401
-
+def weekly_prompt() -> Response:
     if not _onboarding_complete():
         return {'error': 'Onboarding incomplete'}, 403
 
     prompt = current_app.storage_service.get_weekly_prompt(session['user']['id'])
-    return {'prompt': prompt}
+    response = jsonify(prompt=prompt)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 
 @main_bp.route('/api/dashboard_range')
-@login_required
 def dashboard_range() -> Dict[str, Any]:
     user_id = session['user']['id']
     range_key = (request.args.get('range') or 'daily').lower()
@@ -877,7 +1135,6 @@ def dashboard_range() -> Dict[str, Any]:
 
 
 @main_bp.route('/api/dashboard_trends')
-@login_required
 def dashboard_trends() -> Dict[str, Any]:
     user_id = session['user']['id']
     range_key = (request.args.get('range') or 'weekly').lower()
@@ -890,10 +1147,6 @@ def dashboard_trends() -> Dict[str, Any]:
 
 @main_bp.route('/api/daily_calories')
 def daily_calories() -> Dict[str, Any]:
-    redirect_url = _require_login()
-    if redirect_url:
-        return {'error': 'Unauthorized'}, 401
-
     user_id = session['user']['id']
     ingester = getattr(current_app, 'health_ingestion', None)
     data = ingester.daily_calories(user_id) if ingester else []
@@ -901,7 +1154,6 @@ def daily_calories() -> Dict[str, Any]:
 
 
 @main_bp.route('/api/workout_summary_by_type')
-@login_required
 def workout_summary_by_type() -> Dict[str, Any]:
     user_id = session['user']['id']
     ingester = getattr(current_app, 'health_ingestion', None)
@@ -913,7 +1165,6 @@ def workout_summary_by_type() -> Dict[str, Any]:
 
 
 @main_bp.route('/api/daily_macros')
-@login_required
 def daily_macros() -> Dict[str, Any]:
     user_id = session['user']['id']
     ingester = getattr(current_app, 'health_ingestion', None)
@@ -925,7 +1176,6 @@ def daily_macros() -> Dict[str, Any]:
 
 
 @main_bp.route('/api/sleep_summary_by_quality')
-@login_required
 def sleep_summary_by_quality() -> Dict[str, Any]:
     user_id = session['user']['id']
     ingester = getattr(current_app, 'health_ingestion', None)
@@ -937,7 +1187,6 @@ def sleep_summary_by_quality() -> Dict[str, Any]:
 
 
 @main_bp.route('/api/daily_progress_summary')
-@login_required
 def daily_progress_summary() -> Dict[str, Any]:
     user_id = session['user']['id']
     ingester = getattr(current_app, 'health_ingestion', None)
@@ -950,10 +1199,6 @@ def daily_progress_summary() -> Dict[str, Any]:
 
 @main_bp.route('/visualize', methods=['GET', 'POST'])
 def visualize() -> str | Response:
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     onboarding_redirect = _ensure_onboarding_complete()
     if onboarding_redirect:
         return onboarding_redirect
@@ -961,9 +1206,6 @@ def visualize() -> str | Response:
     user = session['user']
     user_id = user['id']
     storage = current_app.storage_service
-    visualizations = storage.refresh_visualization_urls_if_needed(
-        storage.list_visualizations(user_id)
-    )
 
     if request.method == 'POST':
         file = request.files.get('photo')
@@ -972,25 +1214,26 @@ def visualize() -> str | Response:
             return redirect(url_for('main.visualize'))
 
         filename = secure_filename(file.filename)
-        if not filename:
-            filename = 'upload.jpg'
-        extension = Path(filename).suffix.lower()
-        if extension not in {'.jpg', '.jpeg', '.png', '.webp'}:
-            extension = '.jpg'
+        dot, _, extension = filename.rpartition('.')
+        extension = extension.lower() if dot else ''
+        if extension not in _ALLOWED_IMAGE_EXTENSIONS:
+            extension = 'jpg'
         viz_id = uuid4().hex
-        directory = storage.user_images_dir(user_id)
 
         try:
-            upload_bytes = file.read()
-        except Exception:
-            upload_bytes = b''
-
-        if not upload_bytes:
+            original_saved = storage.save_visualization_stream(
+                user_id,
+                file.stream,
+                ext=extension,
+            )
+        except ValueError:
             flash('We could not read your photo. Please try another image.', 'danger')
             return redirect(url_for('main.visualize'))
-
-        temp_path = directory / f'{viz_id}_source{extension}'
-        temp_path.write_bytes(upload_bytes)
+        except Exception:
+            current_app.logger.exception('Failed to persist original image')
+            flash('We could not save your photo. Please try again.', 'danger')
+            return redirect(url_for('main.visualize'))
+        original_path = Path(original_saved['path'])
 
         profile_data = {
             'age': request.form.get('age', '').strip(),
@@ -1008,67 +1251,16 @@ def visualize() -> str | Response:
             'user_name': user.get('name', ''),
         }
 
-        generated_bytes = current_app.ai_service.generate_visualization(temp_path, context)
-
-        if isinstance(generated_bytes, dict):
-            encoded = generated_bytes.get('image_base64')
-            generated_bytes = None
-            if encoded:
-                try:
-                    generated_bytes = base64.b64decode(encoded.split(',')[-1])
-                except Exception:
-                    current_app.logger.warning('Failed to decode generated visualization image payload')
-        elif isinstance(generated_bytes, str):
-            try:
-                generated_bytes = base64.b64decode(generated_bytes.split(',')[-1])
-            except Exception:
-                current_app.logger.warning('Failed to decode visualization image string payload')
-
-        try:
-            original_saved = storage.save_visualization_image(
-                user_id,
-                upload_bytes,
-                ext=extension.lstrip('.') or 'jpg',
-            )
-        except Exception:
-            current_app.logger.exception('Failed to persist original image')
-            flash('We could not save your photo. Please try again.', 'danger')
-            temp_path.unlink(missing_ok=True)
-            return redirect(url_for('main.visualize'))
-
-        future_bytes = generated_bytes or upload_bytes
-        future_ext = 'png' if generated_bytes else (extension.lstrip('.') or 'jpg')
-        try:
-            future_saved = storage.save_visualization_image(
-                user_id,
-                future_bytes,
-                ext=future_ext,
-            )
-        except Exception:
-            current_app.logger.exception('Failed to persist visualization image')
-            temp_path.unlink(missing_ok=True)
-            _cleanup_paths = [original_saved.get('path')]
-            for item in _cleanup_paths:
-                if item:
-                    Path(item).unlink(missing_ok=True)
-            flash('We generated an image but could not save it. Please try again.', 'danger')
-            return redirect(url_for('main.visualize'))
-
-        temp_path.unlink(missing_ok=True)
-
         meta = {
             'id': viz_id,
-            'created_at': future_saved.get('created_at'),
+            'status': 'pending',
+            'created_at': original_saved.get('created_at'),
             'goal_type': context['goal_type'],
             'intensity': context['intensity'],
             'timeline': context['timeline'],
             'profile': profile_data,
             'prompt': f"{context['goal_type']} · {context['timeline']} · {context['intensity']}",
             'model': getattr(current_app.ai_service, '_image_model_id', None),
-            'hash': hashlib.md5(future_bytes).hexdigest(),
-            'key': future_saved.get('key'),
-            'url': future_saved.get('url'),
-            'storage_path': future_saved.get('path'),
             'original_key': original_saved.get('key'),
             'original_url': original_saved.get('url'),
             'original_storage_path': original_saved.get('path'),
@@ -1079,15 +1271,31 @@ def visualize() -> str | Response:
             storage.record_visualization_metadata(user_id, meta)
         except Exception:
             current_app.logger.exception('Failed to persist visualization metadata')
-            for cleanup in (future_saved.get('path'), original_saved.get('path')):
-                if cleanup:
-                    Path(cleanup).unlink(missing_ok=True)
+            original_path.unlink(missing_ok=True)
             flash('Something went wrong while saving your visualization metadata. Please try again.', 'danger')
             return redirect(url_for('main.visualize'))
 
-        flash('Your future self visualization is ready! Explore it below.', 'success')
+        job = {
+            'id': viz_id,
+            'user_id': user_id,
+            'original_path': str(original_path),
+            'original_key': original_saved.get('key'),
+            'original_url': original_saved.get('url'),
+            'context': context,
+        }
+        worker = getattr(current_app, 'visualization_worker', None)
+        if worker:
+            worker.enqueue(job)
+            flash('We are generating your future self visualization. It will appear below in a moment.', 'info')
+        else:
+            VisualizationWorker(storage, current_app.ai_service).process(job)
+            flash('Your future self visualization is ready! Explore it below.', 'success')
         return redirect(url_for('main.visualize'))
 
+    # Only the gallery render needs the listing; every POST path redirects.
+    visualizations = storage.refresh_visualization_urls_if_needed(
+        storage.list_visualizations(user_id)
+    )
     latest_entry = visualizations[0] if visualizations else {}
     latest_profile = dict(latest_entry.get('profile', {})) if latest_entry else {}
     goal_defaults = {
@@ -1104,17 +1312,41 @@ def visualize() -> str | Response:
     )
 
 
+@main_bp.route('/visualize/status/<visualization_id>')
+def visualization_status(visualization_id: str) -> Dict[str, Any]:
+    user_id = session['user']['id']
+    storage = current_app.storage_service
+    for entry in storage.list_visualizations(user_id):
+        if entry.get('id') == visualization_id:
+            status = entry.get('status', 'ready')
+            if status == 'pending' and _visualization_is_stale(entry):
+                status = 'failed'
+                storage.update_visualization_metadata(user_id, visualization_id, {'status': status})
+            return {
+                'id': visualization_id,
+                'status': status,
+                'url': entry.get('url'),
+            }
+    return {'error': 'Not found'}, 404
+
+
+def _visualization_is_stale(entry: Dict[str, Any]) -> bool:
+    try:
+        created_at = datetime.fromisoformat(entry.get('created_at') or '')
+    except ValueError:
+        return False
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - created_at > _VISUALIZATION_PENDING_TIMEOUT
+
+
 @main_bp.route('/visualize/image/<visualization_id>/<variant>')
 def visualize_image(visualization_id: str, variant: str):
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     onboarding_redirect = _ensure_onboarding_complete()
     if onboarding_redirect:
         return onboarding_redirect
 
-    if variant not in {'original', 'future'}:
+    if variant not in _VISUALIZATION_VARIANTS:
         abort(404)
 
     user_id = session['user']['id']
@@ -1132,22 +1364,18 @@ def visualize_image(visualization_id: str, variant: str):
     if candidate:
         path = Path(candidate)
         if path.is_file():
-            return send_from_directory(path.parent, path.name, max_age=86400)
+            return _send_image(path.parent, path.name)
 
     if not fallback:
         abort(404)
 
     directory = current_app.storage_service.user_images_dir(user_id)
     safe_name = Path(fallback).name
-    return send_from_directory(directory, safe_name, max_age=86400)
+    return _send_image(directory, safe_name)
 
 
 @main_bp.route('/user-images/<user_id>/<path:filename>')
 def user_image(user_id: str, filename: str):
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     if session['user']['id'] != user_id:
         abort(403)
 
@@ -1160,15 +1388,11 @@ def user_image(user_id: str, filename: str):
     if not path.exists():
         abort(404)
 
-    return send_from_directory(directory, safe_name, max_age=86400)
+    return _send_image(directory, safe_name)
 
 
 @main_bp.route('/visualize/<visualization_id>/delete', methods=['POST'])
 def delete_visualization(visualization_id: str) -> Response:
-    redirect_url = _require_login()
-    if redirect_url:
-        return redirect(redirect_url)
-
     onboarding_redirect = _ensure_onboarding_complete()
     if onboarding_redirect:
         return onboarding_redirect
@@ -1179,35 +1403,13 @@ def delete_visualization(visualization_id: str) -> Response:
         flash('Visualization not found.', 'warning')
         return redirect(url_for('main.visualize'))
 
-    for path_value in (
-        removed.get('storage_path'),
-        removed.get('original_storage_path'),
-    ):
-        if not path_value:
-            continue
-        try:
-            Path(path_value).unlink()
-        except FileNotFoundError:
-            continue
-
-    # Fallback cleanup for legacy entries storing only filenames
-    directory = current_app.storage_service.user_images_dir(user_id)
-    for key in ('original', 'future'):
-        filename = removed.get(key)
-        if not filename:
-            continue
-        legacy_path = directory / filename
-        try:
-            legacy_path.unlink()
-        except FileNotFoundError:
-            continue
+    current_app.storage_service.delete_visualization_files(user_id, removed)
 
     flash('Visualization deleted.', 'info')
     return redirect(url_for('main.visualize'))
 
 
 @main_bp.route('/settings')
-@login_required
 def settings_view() -> str:
     user = session['user']
     preferences = current_app.storage_service.fetch_preferences(user['id']) or {}
@@ -1216,7 +1418,6 @@ def settings_view() -> str:
 
 
 @main_bp.route('/settings/update-username', methods=['POST'])
-@login_required
 def update_username() -> Response:
     user = session['user']
     target = url_for('main.settings_view')
@@ -1246,7 +1447,6 @@ def update_username() -> Response:
 
 
 @main_bp.route('/settings/update-password', methods=['POST'])
-@login_required
 def update_password() -> Response:
     user = session['user']
     target = url_for('main.settings_view')
@@ -1291,7 +1491,6 @@ def update_password() -> Response:
 
 
 @main_bp.route('/settings/update-preferences', methods=['POST'])
-@login_required
 def update_preferences() -> Response:
     user = session['user']
     target = url_for('main.settings_view')
@@ -1324,7 +1523,6 @@ def update_preferences() -> Response:
 
 
 @main_bp.route('/settings/clear-data', methods=['POST'])
-@login_required
 def clear_account_data() -> Response:
     user = session['user']
     target = url_for('main.settings_view')
@@ -1357,7 +1555,6 @@ def clear_account_data() -> Response:
 
 
 @main_bp.route('/settings/delete-account', methods=['POST'])
-@login_required
 def delete_account() -> Response:
     user = session['user']
     password = request.form.get('confirm_password', '')
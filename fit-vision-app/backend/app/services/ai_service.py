@@ -1,36 +1,117 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
 import logging
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import cached_property, lru_cache
+from itertools import chain, islice
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 from google import genai
 from dotenv import load_dotenv
 from google.genai import types
-from typing import Any, Dict, Mapping, Optional
+from typing import Any, Dict, Mapping, Optional, Tuple
 from collections.abc import Mapping as _MappingABC
 
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
-class AIService:
-    _TOPIC_SEQUENCE = [
-        'physical_profile',
-        'injury_history',
-        'stress',
-        'sleep',
-        'activity',
-        'exercise',
-        'diet',
-        'socialization',
-    ]
+def _prompt_json(value: Any) -> str:
+    """Serialize ``value`` compactly for embedding in a prompt.
+
+    Whitespace and ``\\u`` escapes only add input tokens, so output has no
+    indentation and keeps non-ASCII text as-is.
+    """
+
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _loads_json(text: str) -> Any:
+    """Parse JSON with ``orjson`` when installed; errors subclass ``json.JSONDecodeError``."""
+
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+# A reply wrapped in one Markdown code block: opening fence (with optional
+# language tag) on its own line, body, closing fence at the very end.
+_CODE_FENCE_RE = re.compile(r'\A```[^\n]*\n(.*?)\n?```\Z', re.DOTALL)
+
+_MONTH_NAMES = (
+    'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December',
+)
+
+
+def _plan_date_today() -> str:
+    """Today's UTC date as shown on plans ("January 05, 2026").
+
+    Spelled out from a fixed table rather than ``strftime('%B')`` so the month
+    name never depends on the process locale.
+    """
+
+    today = datetime.now(timezone.utc)
+    return f"{_MONTH_NAMES[today.month - 1]} {today.day:02d}, {today.year}"
+
+
+@dataclass(frozen=True, slots=True)
+class _Topic:
+    """One onboarding intake topic: its keywords and the fallback question that covers it."""
+
+    name: str
+    keywords: Tuple[str, ...]
+    fallback_question: str
+
+
+def _build_keyword_index(
+    topic_keywords: Mapping[str, Tuple[str, ...]],
+) -> Tuple[re.Pattern, Dict[str, frozenset]]:
+    """Compile every topic keyword into one single-pass, case-insensitive matcher.
+
+    The pattern is a zero-width lookahead over all keywords (longest first), so
+    ``finditer`` reports a match at every position where any keyword starts,
+    including inside longer words ("run" in "running"). Only the longest
+    keyword at a position is reported, so each keyword also credits the topics
+    of any shorter keyword it begins with.
+    """
+
+    topics_by_keyword: Dict[str, set] = {}
+    for topic, keywords in topic_keywords.items():
+        for keyword in keywords:
+            topics_by_keyword.setdefault(keyword.lower(), set()).add(topic)
+
+    keyword_topics = {
+        keyword: frozenset().union(
+            *(topics for prefix, topics in topics_by_keyword.items() if keyword.startswith(prefix))
+        )
+        for keyword in topics_by_keyword
+    }
+    alternation = '|'.join(re.escape(keyword) for keyword in sorted(keyword_topics, key=len, reverse=True))
+    return re.compile(f'(?=({alternation}))', re.IGNORECASE), keyword_topics
+
 
+class AIService:
     _ENV_KEY_PRIORITY = (
         'GEMINI_API_KEY',
         'GOOGLE_API_KEY',
@@ -38,69 +119,307 @@ class AIService:
         'FITVISION_GEMINI_API_KEY',
     )
 
-    _TOPIC_KEYWORDS = {
-        'physical_profile': [
-            'height',
-            'weight',
-            'age',
-            'birthday',
-            'gender',
-            'pronoun',
-            'measurements',
-            'body composition',
-        ],
-        'injury_history': [
-            'injury',
-            'injuries',
-            'surgery',
-            'sciatica',
-            'pain',
-            'rehab',
-            'physical therapy',
-            'condition',
-            'medical history',
-        ],
-        'stress': ['stress', 'stressed', 'burnout', 'anxiety', 'pressure', 'overwhelm', 'relax', 'calm','panic'],
-        'sleep': ['sleep', 'bedtime', 'insomnia', 'rest', 'slept', 'wakeup', 'tired', 'tiredness'],
-        'activity': ['activity', 'active', 'movement', 'lifestyle', 'sedentary', 'steps', 'exercise', 'workout'],
-        'exercise': ['exercise', 'workout', 'training', 'fitness', 'gym', 'run', 'yoga', 'cycling', 'swim', 'cardio', 'lift', 'strength', 'HIIT', 'pilates', 'crossfit'],
-        'diet': ['diet', 'nutrition', 'meal', 'food', 'eat', 'eating', 'calorie', 'protein', 'carb', 'fat', 'vegetarian', 'vegan', 'gluten'],
-        'socialization': ['social', 'friends', 'community', 'family', 'support network', 'team', 'teammates', 'connected' ,'lonely', 'isolation', 'relationship'],
-    }
+    _ONBOARDING_PREAMBLE = (
+        "You are a professional health and wellness coach, and the user’s friend. Every"
+        "response should feel like a casual, honest, direct chat with someone who genuinely cares about their wins,"
+        "setbacks, and goals. Favor short, concise, terse 1-3 sentence responses unless asked for more detail."
+
+        "Core vibe:"
+        "  - extremely casual, direct, and conversational. Use everyday language that feels like a friend helping them out."
+        "  - Be concise: favor tight messages. Get right to the point, add just enough detail to make it useful"
+        "  - Recognize and celebrate progress, push the user to continue without sounding scripted or formal."
+        "  - Bring expert-level health and wellness knowledge. Give practical, actionable"
+        " suggestions rooted in sound guidance."
+        "  - Be collaborative and hard on the user to put pressure on them to hit their goals."
+        " Don't be afraid to push them, think of it as helping them be more resiliant in the future."
+
+        "Conversation style:"
+        "  - Use first-person (“I”) and second-person (“you”) to build rapport."
+        "  - Keep answers honest—no toxic positivity or empty cheerleading."
+        "  - When giving steps or plans, outline them clearly (e.g., short numbered lists or bullet"
+        " points)."
+        "  - End with a nudge, question, or next step to keep the dialogue going, unless"
+        " all the topics have been covered and the user has signaled they have no more to update."
+        " Then, guide the user to checkout the Plan page."
+
+        "General constraints:"
+        "  - No lengthy essays, emoji's, lectures, or formal tone."
+        "  - No misinformation."
+        "  - Always tailor advice to the user’s context, goals, and preferences mentioned in the "
+        " conversation."
+
+        "Your mission: help the user reach their goals and get healthier with concise expert wellness"
+        "guidance—just like a trusted friend who happens to be a health and wellness expert."
+    )
+
+    _WELLBEING_DIMENSIONS = (
+        "Core wellbeing dimensions to weave into the intake: mental resilience and stress coping,"
+        " sleep quality and recovery, daily movement and incidental activity, purposeful exercise"
+        " or training, nutrition and hydration habits, social connection/support, energy levels,"
+        " anthropometrics (age, height, weight, gender identity), injury and medical history,"
+        " time/schedule constraints, and motivation/accountability needs."
+    )
+
+    _CHECK_IN_PREAMBLE = (
+        "You are an expert health and wellness coach, and the user’s friend. Every"
+        " response should feel like a casual chat with someone who genuinely cares about their wins,"
+        " and goals. Don't be afraid to poke fun at them or give them a hard time to keep them accountable."
+        " Favor short, concise, terse 1-2 sentence responses unless asked for more detail.\n"
+        "Tone and style:\n"
+        "  - Keep things extremely casual, direct, and authentic—think text from a friend.\n"
+        "  - Celebrate wins, push the user to continue, share new insights or habits the user could explore, and offer concrete, immediately usable tip or reflection.\n"
+        "  - Avoid creating structured plans or long lists unless explicitly asked.\n"
+        "  - Favor short, concise, terse 1-2 sentence responses unless asked for more detail."
+        "  - Keep answers honest—no toxic positivity or empty cheerleading.\n"
+        "Constraints:\n"
+        "  - Stay within health and wellness coaching guidance.\n"
+        "  - Reply as a single message.\n"
+        "  - No lengthy essays, emoji's, lectures, or formal tone.\n"
+        "  - No misinformation.\n"
+        "  - Do not mention being an AI model or referencing prompts."
+    )
 
-    _FALLBACK_TOPIC_QUESTIONS = {
-        'physical_profile': (
-            "To personalise your plan, could you share the basics—age, pronouns or gender identity, "
-            "height, weight, and any body composition goals you're focusing on?"
+    _PLAN_SECTIONS = ('overview', 'workout', 'nutrition', 'habits')
+
+    _PLAN_SCHEMA = (
+        '{\n'
+        '  "overview": {\n'
+        '    "generated_on": "Month DD, YYYY",\n'
+        '    "focus": "short focus summary"\n'
+        '  },\n'
+        '  "workout": {\n'
+        '    "weekly_split": "weekly training split",\n'
+        '    "sample_session": "sample workout session"\n'
+        '  },\n'
+        '  "nutrition": {\n'
+        '    "daily_structure": "daily nutrition structure",\n'
+        '    "hydration": "hydration guidance"\n'
+        '  },\n'
+        '  "habits": {\n'
+        '    "morning": "morning habit",\n'
+        '    "evening": "evening habit",\n'
+        '    "weekly": "weekly reflection habit"\n'
+        '  }\n'
+        '}'
+    )
+
+    # Ordered (label, cue words) pairs for _heuristic_health; cues match as
+    # substrings, so "run" also covers "running".
+    _MEAL_TYPE_CUES = (
+        ('breakfast', ('breakfast', 'morning')),
+        ('lunch', ('lunch',)),
+        ('dinner', ('dinner', 'supper')),
+    )
+    _SLEEP_QUALITY_CUES = (
+        ('great', ('great', 'rested')),
+        ('good', ('good',)),
+        ('okay', ('okay', 'ok')),
+        ('poor', ('bad', 'poor')),
+    )
+    _WORKOUT_TYPE_CUES = (
+        ('cardio', ('run', 'cardio', 'cycling', 'bike')),
+        ('strength', ('lift', 'strength', 'weights')),
+    )
+
+    # Fallback plan sections for generate_plan, matched against the lowercased summary.
+    # Each table is followed by the text used when none of its cues match.
+    _WORKOUT_SPLIT_CUES = (
+        ('4-day split: Upper / Lower / Mobility + Conditioning / Strength Skills', ('strength',)),
+        ('3-day flow: Vinyasa strength, Yin recovery, Mobility + Core', ('yoga',)),
+    )
+    _WORKOUT_SPLIT_DEFAULT = '3-day balanced: Full body strength, Low-impact cardio, Active recovery walk + core'
+    _SAMPLE_SESSION_CUES = (
+        (
+            'Circuit: 3 rounds of air squats, incline push-ups, glute bridges, plank holds (40s on / 20s off).',
+            ('home',),
         ),
-        'injury_history': (
-            "Do you have any current or past injuries, surgeries, or health conditions that affect how "
-            "you move, train, or recover?"
+    )
+    _SAMPLE_SESSION_DEFAULT = (
+        'Gym-based: Warm-up row 5 min, supersets of goblet squats + rows, RDLs + presses, finisher bike sprints.'
+    )
+    _NUTRITION_CUES = (
+        ('Plate method with legumes, tofu, leafy greens, and omega-rich seeds.', ('vegetarian',)),
+    )
+    _NUTRITION_DEFAULT = (
+        'Prioritize lean protein each meal, colorful veggies twice daily, smart carbs timed around workouts.'
+    )
+    # One matcher over the cue words of all three tables, so the summary is scanned once.
+    _PLAN_CUE_PATTERN, _PLAN_CUE_LABELS = _build_keyword_index(
+        dict(_WORKOUT_SPLIT_CUES + _SAMPLE_SESSION_CUES + _NUTRITION_CUES)
+    )
+
+    _VISUALIZATION_DEFAULTS = (
+        ("goal_type", "a healthy and energised appearance"),
+        ("intensity", "moderate"),
+        ("timeline", "six months"),
+    )
+    _VISUALIZATION_PROFILE_KEYS = ("age", "gender", "height", "weight")
+
+    # Opt-in (AI_RESPONSE_CACHE=1) exact-match cache of successful text replies.
+    _RESPONSE_CACHE_SIZE = 1024
+    _RESPONSE_CACHE_TTL_SECONDS = 3600
+    # Gemini summaries depend only on the transcript, so they are always memoized.
+    _SUMMARY_CACHE_SIZE = 256
+    # Longest rolling coach summary the no-Gemini fallback keeps (newest text wins).
+    _ROLLING_SUMMARY_CHARS = 1000
+
+    # Per-process cap on simultaneous Gemini requests, and how rate-limited
+    # (HTTP 429) requests are retried: attempts after the first, base delay.
+    _MAX_CONCURRENT_REQUESTS = 8
+    _RATE_LIMIT_RETRIES = 3
+    _RATE_LIMIT_BACKOFF_SECONDS = 1.0
+
+    _TOPICS = (
+        _Topic(
+            name='physical_profile',
+            keywords=(
+                'height',
+                'weight',
+                'age',
+                'birthday',
+                'gender',
+                'pronoun',
+                'measurements',
+                'body composition',
+            ),
+            fallback_question=(
+                "To personalise your plan, could you share the basics—age, pronouns or gender identity, "
+                "height, weight, and any body composition goals you're focusing on?"
+            ),
         ),
-        'stress': (
-            "I'd love to understand your stress levels. What tends to raise or lower your stress "
-            "throughout the week, and how do you usually decompress?"
+        _Topic(
+            name='injury_history',
+            keywords=(
+                'injury',
+                'injuries',
+                'surgery',
+                'sciatica',
+                'pain',
+                'rehab',
+                'physical therapy',
+                'condition',
+                'medical history',
+            ),
+            fallback_question=(
+                "Do you have any current or past injuries, surgeries, or health conditions that affect how "
+                "you move, train, or recover?"
+            ),
         ),
-        'sleep': (
-            "Sleep sets the tone for everything. How many hours are you typically getting and "
-            "what does your wind-down routine look like?"
+        _Topic(
+            name='stress',
+            keywords=(
+                'stress',
+                'stressed',
+                'burnout',
+                'anxiety',
+                'pressure',
+                'overwhelm',
+                'relax',
+                'calm',
+                'panic',
+            ),
+            fallback_question=(
+                "I'd love to understand your stress levels. What tends to raise or lower your stress "
+                "throughout the week, and how do you usually decompress?"
+            ),
         ),
-        'activity': (
-            "Tell me about your general daily activity. Are you on your feet, at a desk, or "
-            "somewhere in between most days?"
+        _Topic(
+            name='sleep',
+            keywords=('sleep', 'bedtime', 'insomnia', 'rest', 'slept', 'wakeup', 'tired', 'tiredness'),
+            fallback_question=(
+                "Sleep sets the tone for everything. How many hours are you typically getting and "
+                "what does your wind-down routine look like?"
+            ),
         ),
-        'exercise': (
-            "What kind of intentional exercise or workouts are you doing right now, and how do "
-            "they feel for you?"
+        _Topic(
+            name='activity',
+            keywords=(
+                'activity',
+                'active',
+                'movement',
+                'lifestyle',
+                'sedentary',
+                'steps',
+                'exercise',
+                'workout',
+            ),
+            fallback_question=(
+                "Tell me about your general daily activity. Are you on your feet, at a desk, or "
+                "somewhere in between most days?"
+            ),
         ),
-        'diet': (
-            "Walk me through a typical day of eating. Any preferences or restrictions I should keep in mind?"
+        _Topic(
+            name='exercise',
+            keywords=(
+                'exercise',
+                'workout',
+                'training',
+                'fitness',
+                'gym',
+                'run',
+                'yoga',
+                'cycling',
+                'swim',
+                'cardio',
+                'lift',
+                'strength',
+                'HIIT',
+                'pilates',
+                'crossfit',
+            ),
+            fallback_question=(
+                "What kind of intentional exercise or workouts are you doing right now, and how do "
+                "they feel for you?"
+            ),
         ),
-        'socialization': (
-            "Community matters too—who's in your corner? How connected do you feel with friends, family, "
-            "or teammates lately?"
+        _Topic(
+            name='diet',
+            keywords=(
+                'diet',
+                'nutrition',
+                'meal',
+                'food',
+                'eat',
+                'eating',
+                'calorie',
+                'protein',
+                'carb',
+                'fat',
+                'vegetarian',
+                'vegan',
+                'gluten',
+            ),
+            fallback_question=(
+                "Walk me through a typical day of eating. Any preferences or restrictions I should keep in mind?"
+            ),
         ),
-    }
+        _Topic(
+            name='socialization',
+            keywords=(
+                'social',
+                'friends',
+                'community',
+                'family',
+                'support network',
+                'team',
+                'teammates',
+                'connected',
+                'lonely',
+                'isolation',
+                'relationship',
+            ),
+            fallback_question=(
+                "Community matters too—who's in your corner? How connected do you feel with friends, family, "
+                "or teammates lately?"
+            ),
+        ),
+    )
+
+    # Derived lookups: topic names in interview order, the keyword matcher, and
+    # the question asked when a topic is still uncovered.
+    _TOPIC_SEQUENCE = tuple(topic.name for topic in _TOPICS)
+    _KEYWORD_PATTERN, _KEYWORD_TOPICS = _build_keyword_index({topic.name: topic.keywords for topic in _TOPICS})
+    _FALLBACK_TOPIC_QUESTIONS = {topic.name: topic.fallback_question for topic in _TOPICS}
 
     """Abstraction around the Gemini API with deterministic fallbacks.
 
@@ -112,20 +431,34 @@ class AIService:
 
     def __init__(self) -> None:
         self._api_key: Optional[str] = self._resolve_api_key()
-        self._gemini_model = self._configure_gemini(self._api_key)
-        self._image_model = self._configure_image_model(self._api_key)
-        self.client: Optional[genai.Client] = None
+        # Only a truthiness flag; the client itself is built on first use.
+        self._gemini_model = bool(self._api_key)
         self._image_model_id = "gemini-2.5-flash-image"
         self._text_model_id = "gemini-2.5-flash"
-        self._image_ready: bool = False
+        self._response_cache: Optional["OrderedDict[bytes, Tuple[float, str]]"] = (
+            OrderedDict() if os.environ.get('AI_RESPONSE_CACHE') == '1' else None
+        )
+        self._summaries: "OrderedDict[bytes, str]" = OrderedDict()
+        self._inflight: Dict[bytes, "Future[str]"] = {}
+        self._cache_lock = threading.Lock()
+        self._request_slots = threading.BoundedSemaphore(self._MAX_CONCURRENT_REQUESTS)
         if self._api_key:
-                    logger.info("GOOGLE_API_KEY detected (len=%d, prefix=%s****)",
-                                len(self._api_key), self._api_key[:4])
+            logger.info("GOOGLE_API_KEY detected (len=%d, prefix=%s****)",
+                        len(self._api_key), self._api_key[:4])
         else:
             logger.warning("GOOGLE_API_KEY missing at startup")
 
-        self._image_ready = self._configure_image_model(self._api_key)
-        logger.info("Gemini image client ready: %s", self._image_ready)
+    @cached_property
+    def client(self) -> Optional[genai.Client]:
+        """Shared Gemini client for text and image calls, created lazily."""
+
+        if not self._api_key:
+            return None
+        try:
+            return genai.Client(api_key=self._api_key)
+        except Exception as exc:  # pragma: no cover - external SDK
+            logger.warning('Gemini integration disabled: %s', exc)
+            return None
 
     def continue_onboarding(self, conversation: List[Dict[str, str]], user: Dict[str, str]) -> str:
         """Generate the assistant's next onboarding message."""
@@ -134,24 +467,75 @@ class AIService:
 
         if self._gemini_model:
             prompt = self._build_onboarding_prompt(conversation, user, topics_state)
-            ai_reply = self._call_gemini(prompt)
+            ai_reply = self._call_gemini(prompt, system_instruction=self._ONBOARDING_PREAMBLE)
             if ai_reply:
                 return ai_reply
 
         # Heuristic fallback keeps the experience running without an API key.
         return self._fallback_onboarding_question(conversation, topics_state)
 
+    def stream_continue_onboarding(self, conversation: List[Dict[str, str]], user: Dict[str, str]) -> Iterator[str]:
+        """Yield the next onboarding message in chunks as Gemini produces them.
+
+        Falls back to the heuristic question, as a single chunk, when Gemini is
+        unavailable or returns nothing.
+        """
+
+        topics_state = self._topics_state(conversation)
+
+        if self._gemini_model:
+            prompt = self._build_onboarding_prompt(conversation, user, topics_state)
+            streamed = False
+            for chunk in self._stream_gemini(prompt, system_instruction=self._ONBOARDING_PREAMBLE):
+                streamed = True
+                yield chunk
+            if streamed:
+                return
+
+        yield self._fallback_onboarding_question(conversation, topics_state)
+
     def check_in(self, conversation: List[Dict[str, str]], user: Dict[str, str]) -> str:
         """Generate a friendly check-in reply for returning users."""
 
         if self._gemini_model:
             prompt = self._build_check_in_prompt(conversation, user)
-            ai_reply = self._call_gemini(prompt)
+            ai_reply = self._call_gemini(prompt, system_instruction=self._CHECK_IN_PREAMBLE)
             if ai_reply:
                 return ai_reply
 
         return self._fallback_check_in(conversation, user)
 
+    def stream_check_in(self, conversation: List[Dict[str, str]], user: Dict[str, str]) -> Iterator[str]:
+        """Yield the check-in reply in chunks as Gemini produces them.
+
+        Falls back to the heuristic reply, as a single chunk, when Gemini is
+        unavailable or returns nothing.
+        """
+
+        if self._gemini_model:
+            prompt = self._build_check_in_prompt(conversation, user)
+            streamed = False
+            for chunk in self._stream_gemini(prompt, system_instruction=self._CHECK_IN_PREAMBLE):
+                streamed = True
+                yield chunk
+            if streamed:
+                return
+
+        yield self._fallback_check_in(conversation, user)
+
+    def roll_summary(self, previous_summary: str, turns: List[Dict[str, str]]) -> str:
+        """Fold turns that aged out of the prompt window into the running summary."""
+
+        if self._gemini_model:
+            summary = self._gemini_summary(self._with_summary(previous_summary, turns))
+            if summary:
+                return summary
+
+        # The heuristic only keeps user messages, so carry the earlier summary
+        # forward explicitly instead of letting it drop out with the assistant turns.
+        rolled = ' '.join(part for part in (previous_summary, self._user_highlights(turns)) if part)
+        return rolled[-self._ROLLING_SUMMARY_CHARS:]
+
     def interpret_health_log(self, log_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Interpret a progress log into structured health insights."""
 
@@ -176,7 +560,7 @@ class AIService:
             return None
 
         try:
-            metadata_json = json.dumps(metadata)
+            metadata_json = _prompt_json(metadata)
         except Exception:
             return None
 
@@ -194,8 +578,7 @@ class AIService:
             return None
 
         try:
-            cleaned = self._strip_code_fences(raw)
-            data = json.loads(cleaned)
+            data = self._load_model_json(raw)
         except Exception:
             return None
 
@@ -243,8 +626,7 @@ class AIService:
             return None
 
         try:
-            cleaned = self._strip_code_fences(raw)
-            data = json.loads(cleaned)
+            data = self._load_model_json(raw)
             if not isinstance(data, dict):
                 return None
 
@@ -275,8 +657,7 @@ class AIService:
             return None
 
         try:
-            cleaned = self._strip_code_fences(raw)
-            data = json.loads(cleaned)
+            data = self._load_model_json(raw)
             if not isinstance(data, dict):
                 return None
             if "duration_min" in data and data["duration_min"] is not None:
@@ -305,8 +686,7 @@ class AIService:
             return None
 
         try:
-            cleaned = self._strip_code_fences(raw)
-            data = json.loads(cleaned)
+            data = self._load_model_json(raw)
             if not isinstance(data, dict) or "calories" not in data:
                 return None
             for key in ("calories", "protein_g", "carbs_g", "fat_g"):
@@ -335,7 +715,8 @@ class AIService:
                 return structured_plan
 
         summary = self._summarize_conversation(conversation)
-        today = datetime.now(timezone.utc).strftime('%B %d, %Y')
+        cues = self._plan_cues(summary)
+        today = _plan_date_today()
 
         plan = {
             'overview': {
@@ -343,11 +724,11 @@ class AIService:
                 'focus': summary,
             },
             'workout': {
-                'weekly_split': self._build_workout_split(summary),
-                'sample_session': self._sample_session(summary),
+                'weekly_split': self._build_workout_split(cues),
+                'sample_session': self._sample_session(cues),
             },
             'nutrition': {
-                'daily_structure': self._build_nutrition(summary),
+                'daily_structure': self._build_nutrition(cues),
                 'hydration': 'Aim for at least 2.5L of water daily with electrolytes on training days.',
             },
             'habits': {
@@ -390,19 +771,21 @@ class AIService:
     def generate_visualization(self, image_path: Path, context: Mapping[str, Any]) -> Optional[bytes]:
         """
         Text+image -> image. Uses client.models.generate_content(model=..., contents=[...]).
+
+        Returns ``None`` when no image was generated; callers reuse the original.
         """
         if not isinstance(context, (dict, _MappingABC)):
             logger.error("Invalid visualization context type: %r", type(context))
-            return self._safe_fallback(image_path)
+            return None
         
         prompt: str = self._build_visualization_prompt(dict(context))  # build the context string
         if not isinstance(prompt, str) or not prompt:
             logger.error("Built prompt is not a non-empty string")
-            return self._safe_fallback(image_path)
+            return None
         
         if not self.client:
             logger.warning("Gemini client not configured")
-            return self._safe_fallback(image_path)
+            return None
         
         # Store original image URL in context before generating the new one
         if 'original_url' not in context:
@@ -419,13 +802,15 @@ class AIService:
         image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime)
         
         try:
-            response = self.client.models.generate_content(
-                model=self._image_model_id,
-                contents=[prompt, image_part],
+            response = self._rate_limited(
+                lambda: self.client.models.generate_content(
+                    model=self._image_model_id,
+                    contents=[prompt, image_part],
+                )
             )
         except Exception as exc:
             logger.warning("Gemini image generation failed (request): %s", exc)
-            return self._safe_fallback(image_path)
+            return None
 
             # Extract first inline image
         try:    
@@ -445,15 +830,8 @@ class AIService:
         except Exception as exc:
             logger.warning("Gemini image generation failed (parse): %s", exc)
 
-        return self._safe_fallback(image_path)
+        return None
 
-    def _safe_fallback(self, image_path: Path) -> Optional[bytes]:
-        """Why: Guarantees a result path even if generation fails."""
-        try:
-            return image_path.read_bytes()
-        except OSError:
-            return None
-        
     # --- Helper methods -------------------------------------------------
 
     def _resolve_api_key(self) -> Optional[str]:
@@ -462,93 +840,78 @@ class AIService:
             logger.info('Gemini API key not found in environment; using fallback prompts.')
         return api_key
 
-    def _configure_gemini(self, api_key: Optional[str]) -> Optional[Any]:
-        if not api_key:
-            return False
-        try:
-            self.client = genai.Client(api_key=api_key)
-            return self.client
-        except Exception as exc:  # pragma: no cover - defensive logging
-            logger.warning('Gemini integration disabled: %s', exc)
-            self.client = None
-            return None
-
-    def _configure_image_model(self, api_key: Optional[str]) -> bool:
-        """
-        Initialize the Client for the Gemini Developer API.
-        Why: In the google-genai SDK, inference goes through client.models.generate_content(...).
-        """
-        if not api_key:
-            return False
-        try:
-            self.client = genai.Client(api_key=api_key)
-            return True
-        except Exception as exc:  # pragma: no cover - external SDK
-            logger.warning("Gemini client init failed: %s", exc)
-            self.client = None
-            return False
-
     @staticmethod
     def _get_env_value(*names: str) -> Optional[str]:
-        for name in names:
-            value = os.getenv(name)
-            if value:
-                return value
-        return None
+        environ = os.environ
+        return next((environ[name] for name in names if environ.get(name)), None)
 
     def _build_visualization_prompt(self, context: Dict[str, Any]) -> str:
         """
         Build a single-string prompt for image generation from the given context.
         Ensures we pass only a str to the SDK (no dicts/lists).
         """
-        goal = str(context.get("goal_type", "a healthy and energised appearance")).strip() or "a healthy and energised appearance"
-        intensity = str(context.get("intensity", "moderate")).strip() or "moderate"
-        timeline = str(context.get("timeline", "six months")).strip() or "six months"
+        goal, intensity, timeline = (
+            self._clean_text(context.get(key), default) for key, default in self._VISUALIZATION_DEFAULTS
+        )
 
         profile = context.get("profile") or {}
         if not isinstance(profile, dict):
             profile = {}
 
-        keys = ("age", "gender", "height", "weight")
-        bits = []
-        for k in keys:
-            v = profile.get(k)
-            if v is None:
-                continue
-            s = str(v).strip()
-            if s:
-                bits.append(f"{k.replace('_', ' ')} {s}")
-        profile_text = ", ".join(bits) if bits else "overall wellbeing"
-
-        lines = [
-            "Analyze the provided image of a person.",
-            "Create a hyper-realistic, encouraging future version of this person showing off every inch of their body.",
-            "Output must be a high-quality PNG image and nothing else.",
-            f"Goal: {goal}.",
-            f"Transformation intensity: {intensity}.",
-            f"Timeline: {timeline}.",
-            (
-                "Keep proportions natural, honor the individual's facial features and characteristics "
-                f"({profile_text}), and express vitality."
-            ),
-        ]
-        return " ".join(lines).strip()
+        profile_text = ", ".join(
+            f"{key} {value}"
+            for key in self._VISUALIZATION_PROFILE_KEYS
+            if (value := self._clean_text(profile.get(key)))
+        ) or "overall wellbeing"
+
+        return (
+            "Analyze the provided image of a person. "
+            "Create a hyper-realistic, encouraging future version of this person showing off every inch of their body. "
+            "Output must be a high-quality PNG image and nothing else. "
+            f"Goal: {goal}. "
+            f"Transformation intensity: {intensity}. "
+            f"Timeline: {timeline}. "
+            "Keep proportions natural, honor the individual's facial features and characteristics "
+            f"({profile_text}), and express vitality."
+        )
+
+    @staticmethod
+    def _clean_text(value: Any, default: str = "") -> str:
+        text = str(value).strip() if value is not None else ""
+        return text or default
 
     def _guess_mime_type(self, path: Path) -> str:
         return "image/png" if path.suffix.lower() == ".png" else "image/jpeg"
 
 
     def _topics_state(self, conversation: List[Dict[str, str]]) -> Dict[str, List[str]]:
-        transcript = ' '.join((message.get('content') or '').lower() for message in conversation)
-        covered = []
-        for topic in self._TOPIC_SEQUENCE:
-            keywords = self._TOPIC_KEYWORDS.get(topic, [])
-            if any(keyword in transcript for keyword in keywords):
-                covered.append(topic)
-
-        remaining = [topic for topic in self._TOPIC_SEQUENCE if topic not in covered]
+        found: set = set()
+        for message in conversation:
+            content = message.get('content')
+            if not content:
+                continue
+            found |= self._message_topics(content)
+            if len(found) == len(self._TOPIC_SEQUENCE):
+                break
+
+        covered = [topic for topic in self._TOPIC_SEQUENCE if topic in found]
+        remaining = [topic for topic in self._TOPIC_SEQUENCE if topic not in found]
         return {'covered': covered, 'remaining': remaining}
 
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _message_topics(content: str) -> frozenset:
+        """Topics mentioned in one message.
+
+        Memoized by content: every onboarding turn re-checks the whole history,
+        but only the newest message has not been scanned before.
+        """
+
+        found: set = set()
+        for match in AIService._KEYWORD_PATTERN.finditer(content):
+            found.update(AIService._KEYWORD_TOPICS[match.group(1).lower()])
+        return frozenset(found)
+
     def _fallback_onboarding_question(
         self,
         conversation: List[Dict[str, str]],
@@ -592,14 +955,6 @@ class AIService:
         remaining_topics = topics_state['remaining']
         covered_topics = topics_state['covered'] or ['none yet']
 
-        wellbeing_dimensions = (
-            "Core wellbeing dimensions to weave into the intake: mental resilience and stress coping,"
-            " sleep quality and recovery, daily movement and incidental activity, purposeful exercise"
-            " or training, nutrition and hydration habits, social connection/support, energy levels,"
-            " anthropometrics (age, height, weight, gender identity), injury and medical history,"
-            " time/schedule constraints, and motivation/accountability needs."
-        )
-
         if remaining_topics:
             next_topic = remaining_topics[0]
             topics_guidance = (
@@ -618,40 +973,10 @@ class AIService:
             )
 
         return (
-            "You are a professional health and wellness coach, and the user’s friend. Every"
-            "response should feel like a casual, honest, direct chat with someone who genuinely cares about their wins,"
-            "setbacks, and goals. Favor short, concise, terse 1-3 sentence responses unless asked for more detail."
-
-            "Core vibe:"
-            "  - extremely casual, direct, and conversational. Use everyday language that feels like a friend helping them out."
-            "  - Be concise: favor tight messages. Get right to the point, add just enough detail to make it useful"
-            "  - Recognize and celebrate progress, push the user to continue without sounding scripted or formal."
-            "  - Bring expert-level health and wellness knowledge. Give practical, actionable"
-            " suggestions rooted in sound guidance."
-            "  - Be collaborative and hard on the user to put pressure on them to hit their goals."
-            " Don't be afraid to push them, think of it as helping them be more resiliant in the future."
-
-            "Conversation style:"
-            "  - Use first-person (“I”) and second-person (“you”) to build rapport."
-            "  - Keep answers honest—no toxic positivity or empty cheerleading."
-            "  - When giving steps or plans, outline them clearly (e.g., short numbered lists or bullet"
-            " points)."
-            "  - End with a nudge, question, or next step to keep the dialogue going, unless"
-            " all the topics have been covered and the user has signaled they have no more to update."
-            " Then, guide the user to checkout the Plan page."
-
-            "General constraints:"
-            "  - No lengthy essays, emoji's, lectures, or formal tone."
-            "  - No misinformation."
-            "  - Always tailor advice to the user’s context, goals, and preferences mentioned in the "
-            " conversation."
-
-            "Your mission: help the user reach their goals and get healthier with concise expert wellness"
-            "guidance—just like a trusted friend who happens to be a health and wellness expert.\n"
             f"User name: {user_name}.\n"
             "Conversation summary so far:\n"
             f"{summary}\n"
-            f"{wellbeing_dimensions}\n"
+            f"{self._WELLBEING_DIMENSIONS}\n"
             f"{topics_guidance}\n"
             "Provide the next assistant reply to continue the intake."
         )
@@ -663,33 +988,7 @@ class AIService:
         summary = self._summarize_conversation(conversation)
         user_name = user.get('name') or 'friend'
 
-        tone = (
-            "You are an expert health and wellness coach, and the user’s friend. Every"
-            " response should feel like a casual chat with someone who genuinely cares about their wins,"
-            " and goals. Don't be afraid to poke fun at them or give them a hard time to keep them accountable."
-            " Favor short, concise, terse 1-2 sentence responses unless asked for more detail."
-        )
-        vibe = (
-            "Tone and style:\n"
-            "  - Keep things extremely casual, direct, and authentic—think text from a friend.\n"
-            "  - Celebrate wins, push the user to continue, share new insights or habits the user could explore, and offer concrete, immediately usable tip or reflection.\n"
-            "  - Avoid creating structured plans or long lists unless explicitly asked.\n"
-            "  - Favor short, concise, terse 1-2 sentence responses unless asked for more detail."
-            "  - Keep answers honest—no toxic positivity or empty cheerleading."
-        )
-        guardrails = (
-            "Constraints:\n"
-            "  - Stay within health and wellness coaching guidance.\n"
-            "  - Reply as a single message.\n"
-            "  - No lengthy essays, emoji's, lectures, or formal tone.\n"
-            "  - No misinformation.\n"
-            "  - Do not mention being an AI model or referencing prompts."
-        )
-
         return (
-            f"{tone}\n"
-            f"{vibe}\n"
-            f"{guardrails}\n"
             f"User name: {user_name}.\n"
             "Conversation summary so far:\n"
             f"{summary}\n"
@@ -727,29 +1026,7 @@ class AIService:
         transcript = self._format_conversation(conversation)
         summary = self._summarize_conversation(conversation)
         user_name = user.get('name') or 'the user'
-        today = datetime.now(timezone.utc).strftime('%B %d, %Y')
-
-        schema = (
-            '{\n'
-            '  "overview": {\n'
-            '    "generated_on": "Month DD, YYYY",\n'
-            '    "focus": "short focus summary"\n'
-            '  },\n'
-            '  "workout": {\n'
-            '    "weekly_split": "weekly training split",\n'
-            '    "sample_session": "sample workout session"\n'
-            '  },\n'
-            '  "nutrition": {\n'
-            '    "daily_structure": "daily nutrition structure",\n'
-            '    "hydration": "hydration guidance"\n'
-            '  },\n'
-            '  "habits": {\n'
-            '    "morning": "morning habit",\n'
-            '    "evening": "evening habit",\n'
-            '    "weekly": "weekly reflection habit"\n'
-            '  }\n'
-            '}'
-        )
+        today = _plan_date_today()
 
         return (
             "You are a professional health and wellness companion who crafts detailed yet "
@@ -761,7 +1038,7 @@ class AIService:
             "Conversation transcript:\n"
             f"{transcript}\n"
             "Return only valid JSON (no Markdown formatting) following this schema:\n"
-            f"{schema}\n"
+            f"{self._PLAN_SCHEMA}\n"
             "Keep each value to 1-3 sentences tailored to the user's goals."
         )
 
@@ -776,8 +1053,7 @@ class AIService:
         onboarding_transcript = self._format_conversation(conversation)
         log_summary = self._format_logs(logs)
         user_name = user.get('name') or 'the user'
-        today = datetime.now(timezone.utc).strftime('%B %d, %Y')
-        schema = self._get_plan_schema()
+        today = _plan_date_today()
 
         return (
             "You are a professional health and wellness coach who adapts a user's wellness plan based on their progress. "
@@ -788,7 +1064,7 @@ class AIService:
             "--- Original Onboarding Context ---\n"
             f"{onboarding_transcript}\n\n"
             "--- Current Plan ---\n"
-            f"{json.dumps(current_plan, indent=2)}\n\n"
+            f"{_prompt_json(current_plan)}\n\n"
             "--- Recent Progress Logs ---\n"
             f"{log_summary}\n\n"
             "--- Your Task ---\n"
@@ -797,80 +1073,63 @@ class AIService:
             "3. Adjust the workout, nutrition, or habits sections to better support the user. For example, if sleep is a "
             "   challenge, suggest a more robust evening habit. If workouts are consistent, suggest a progression.\n"
             "4. Return ONLY a valid JSON object for the new plan, strictly following this schema:\n"
-            f"{schema}"
+            f"{self._PLAN_SCHEMA}"
         )
 
     def _parse_plan_response(self, raw: str) -> Optional[Dict[str, Dict[str, str]]]:
         if not raw:
             return None
 
-        cleaned = self._strip_code_fences(raw)
-
         data: Optional[Dict[str, Any]]
         try:
-            parsed = json.loads(cleaned)
+            parsed = self._load_model_json(raw)
             data = parsed if isinstance(parsed, dict) else None
         except json.JSONDecodeError:
-            data = self._extract_json_fragment(cleaned)
+            data = self._extract_json_fragment(self._strip_code_fences(raw))
 
         if not data:
             return None
 
-        plan = {
-            'overview': self._coerce_section(data.get('overview')),
-            'workout': self._coerce_section(data.get('workout')),
-            'nutrition': self._coerce_section(data.get('nutrition')),
-            'habits': self._coerce_section(data.get('habits')),
-        }
-
-        if any(section for section in plan.values()):
-            if 'generated_on' not in plan['overview']:
-                plan['overview']['generated_on'] = datetime.now(timezone.utc).strftime('%B %d, %Y')
-            return plan
-        return None
+        plan = {section: self._coerce_section(data.get(section)) for section in self._PLAN_SECTIONS}
+        if not any(plan.values()):
+            return None
 
-    def _get_plan_schema(self) -> str:
-        """Returns the JSON schema for the wellness plan."""
-        return (
-            '{\n'
-            '  "overview": {\n'
-            '    "generated_on": "Month DD, YYYY",\n'
-            '    "focus": "short focus summary"\n'
-            '  },\n'
-            '  "workout": {\n'
-            '    "weekly_split": "weekly training split",\n'
-            '    "sample_session": "sample workout session"\n'
-            '  },\n'
-            '  "nutrition": {\n'
-            '    "daily_structure": "daily nutrition structure",\n'
-            '    "hydration": "hydration guidance"\n'
-            '  },\n'
-            '  "habits": {\n'
-            '    "morning": "morning habit",\n'
-            '    "evening": "evening habit",\n'
-            '    "weekly": "weekly reflection habit"\n'
-            '  }\n'
-            '}'
-        )
+        overview = plan['overview']
+        if 'generated_on' not in overview:
+            overview['generated_on'] = _plan_date_today()
+        return plan
 
     def _extract_json_fragment(self, text: str) -> Optional[Dict[str, Any]]:
+        """Return the first JSON object embedded in surrounding prose.
+
+        ``raw_decode`` parses one complete value from an offset and ignores
+        whatever follows, so trailing commentary (even with braces in it) no
+        longer spoils the parse.
+        """
+
         start = text.find('{')
-        end = text.rfind('}')
-        if start == -1 or end == -1 or end <= start:
-            return None
-        fragment = text[start : end + 1]
+        while start != -1:
+            try:
+                parsed, _ = _JSON_DECODER.raw_decode(text, start)
+                return parsed
+            except json.JSONDecodeError:
+                start = text.find('{', start + 1)
+        return None
+
+    def _load_model_json(self, raw: str) -> Any:
+        """Parse a model reply as JSON, stripping Markdown code fences only if needed."""
+
         try:
-            parsed = json.loads(fragment)
-            return parsed if isinstance(parsed, dict) else None
+            return _loads_json(raw)
         except json.JSONDecodeError:
-            return None
+            return _loads_json(self._strip_code_fences(raw))
 
     def _strip_code_fences(self, raw: str) -> str:
         cleaned = raw.strip()
-        if cleaned.startswith('```') and cleaned.endswith('```'):
-            lines = [line for line in cleaned.splitlines() if not line.strip().startswith('```')]
-            return '\n'.join(lines).strip()
-        return cleaned
+        if not cleaned.startswith('```'):
+            return cleaned
+        match = _CODE_FENCE_RE.match(cleaned)
+        return match.group(1).strip() if match else cleaned
 
     def _build_health_prompt(self, log_entry: Dict[str, Any], timestamp: datetime) -> str:
         return (
@@ -878,7 +1137,7 @@ class AIService:
             "return structured JSON for meals, sleep, and workout fields. Use UTC date of the provided timestamp as 'today'. "
             "Do not re-estimate calories or macros. Use null for unknowns. Strict JSON only.\n\n"
             f"Timestamp reference (UTC): {timestamp.isoformat()}\n"
-            f"Log entry JSON: {json.dumps(log_entry)}\n"
+            f"Log entry JSON: {_prompt_json(log_entry)}\n"
             "Respond with keys meals, sleep, workout."
         )
 
@@ -886,8 +1145,7 @@ class AIService:
         if not raw:
             return None
         try:
-            cleaned = self._strip_code_fences(raw)
-            data = json.loads(cleaned)
+            data = self._load_model_json(raw)
             return data if isinstance(data, dict) else None
         except Exception:
             return None
@@ -903,54 +1161,44 @@ class AIService:
             dt = dt.replace(tzinfo=timezone.utc)
         return dt
 
+    @staticmethod
+    def _match_cue(lowered: str, cues: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> Optional[str]:
+        """Return the first label whose cue words appear anywhere in ``lowered``."""
+
+        for label, words in cues:
+            if any(word in lowered for word in words):
+                return label
+        return None
+
     def _heuristic_health(self, log_entry: Dict[str, Any], timestamp: datetime) -> Dict[str, Any]:
         date_iso = timestamp.date().isoformat()
         meals_text = str(log_entry.get("meals", "") or "")
         sleep_text = str(log_entry.get("sleep", "") or "")
         workout_text = str(log_entry.get("workout", "") or "")
 
-        meal_type = "unknown"
-        lowered_meal = meals_text.lower()
-        if any(word in lowered_meal for word in ["breakfast", "morning"]):
-            meal_type = "breakfast"
-        elif "lunch" in lowered_meal:
-            meal_type = "lunch"
-        elif "dinner" in lowered_meal or "supper" in lowered_meal:
-            meal_type = "dinner"
-        elif meals_text:
-            meal_type = "snack"
+        lowered_sleep = sleep_text.lower()
+        lowered_workout = workout_text.lower()
+
+        meal_type = self._match_cue(meals_text.lower(), self._MEAL_TYPE_CUES) or ("snack" if meals_text else "unknown")
 
         hours_slept = None
-        match = re.search(r"(\d+(?:\.\d+)?)\s*(h|hours)", sleep_text.lower())
+        match = re.search(r"(\d+(?:\.\d+)?)\s*(h|hours)", lowered_sleep)
         if match:
             try:
                 hours_slept = float(match.group(1))
             except Exception:
                 hours_slept = None
 
-        sleep_quality = "unknown"
-        if any(word in sleep_text.lower() for word in ["great", "rested"]):
-            sleep_quality = "great"
-        elif "good" in sleep_text.lower():
-            sleep_quality = "good"
-        elif "okay" in sleep_text.lower() or "ok" in sleep_text.lower():
-            sleep_quality = "okay"
-        elif "bad" in sleep_text.lower() or "poor" in sleep_text.lower():
-            sleep_quality = "poor"
+        sleep_quality = self._match_cue(lowered_sleep, self._SLEEP_QUALITY_CUES) or "unknown"
 
         duration = None
-        durations = re.findall(r"(\d+)\s*(?:min|minutes)", workout_text.lower())
+        durations = re.findall(r"(\d+)\s*(?:min|minutes)", lowered_workout)
         if durations:
             duration = sum(int(value) for value in durations)
 
-        workout_type = "other"
-        lower_workout = workout_text.lower()
-        if any(word in lower_workout for word in ["run", "cardio", "cycling", "bike"]):
-            workout_type = "cardio"
-        elif any(word in lower_workout for word in ["lift", "strength", "weights"]):
-            workout_type = "strength"
-        elif workout_text:
-            workout_type = "mixed"
+        workout_type = self._match_cue(lowered_workout, self._WORKOUT_TYPE_CUES) or (
+            "mixed" if workout_text else "other"
+        )
 
         return {
             "meals": {
@@ -979,19 +1227,154 @@ class AIService:
             return {'summary': str(section)}
         return {}
 
-    def _call_gemini(self, prompt: str) -> str:
+    def _call_gemini(self, prompt: str, system_instruction: Optional[str] = None) -> str:
         if not self._gemini_model:
             return ''
 
+        key = hashlib.blake2b(
+            f"{self._text_model_id}\0{system_instruction or ''}\0{prompt}".encode(), digest_size=16
+        ).digest()
+        if self._response_cache is not None:
+            cached = self._cached_response(key)
+            if cached:
+                return cached
+
+        # Single-flight: a caller that finds the same request already running
+        # waits for its reply instead of sending a duplicate.
+        with self._cache_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+        if not leader:
+            return flight.result()
+
+        text = ''
+        try:
+            text = self._generate_text(prompt, system_instruction)
+        finally:
+            with self._cache_lock:
+                del self._inflight[key]
+            flight.set_result(text)
+
+        if text and self._response_cache is not None:
+            self._store_response(key, text)
+        return text
+
+    def _generate_text(self, prompt: str, system_instruction: Optional[str]) -> str:
         try:  # pragma: no cover - external service call
-             response = self.client.models.generate_content(
-                model=self._text_model_id,
-                contents=[prompt],
+            response = self._rate_limited(
+                lambda: self.client.models.generate_content(
+                    model=self._text_model_id,
+                    contents=prompt,
+                    config=self._generation_config(system_instruction),
+                )
             )
         except Exception as exc:  # pragma: no cover - defensive logging
             logger.warning('Gemini request failed: %s', exc)
             return ''
+        return self._response_text(response)
+
+    def _rate_limited(self, request: Callable[[], Any]) -> Any:
+        """Run one Gemini request within the concurrency cap, backing off on HTTP 429.
+
+        The slot is released while sleeping so other requests can proceed.
+        """
+
+        for attempt in range(self._RATE_LIMIT_RETRIES + 1):
+            with self._request_slots:
+                try:
+                    return request()
+                except Exception as exc:
+                    if not self._should_retry(exc, attempt):
+                        raise
+            self._back_off(attempt)
+
+    def _should_retry(self, exc: Exception, attempt: int) -> bool:
+        return getattr(exc, 'code', None) == 429 and attempt < self._RATE_LIMIT_RETRIES
+
+    def _back_off(self, attempt: int) -> None:
+        time.sleep(self._RATE_LIMIT_BACKOFF_SECONDS * 2**attempt)
+
+    def _cached_response(self, key: bytes) -> Optional[str]:
+        with self._cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, text = entry
+            if expires_at <= time.monotonic():
+                del self._response_cache[key]
+                return None
+            self._response_cache.move_to_end(key)
+            return text
+
+    def _store_response(self, key: bytes, text: str) -> None:
+        with self._cache_lock:
+            self._response_cache[key] = (time.monotonic() + self._RESPONSE_CACHE_TTL_SECONDS, text)
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self._RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+
+    def _stream_gemini(self, prompt: str, system_instruction: Optional[str] = None) -> Iterator[str]:
+        """Yield reply text as Gemini streams it.
+
+        Failures before the first chunk are logged and end the stream empty, so
+        callers fall back to their heuristic reply. Once text has started to
+        flow, a failure is raised to the caller, which has already sent part of
+        the reply and must not treat it as complete.
+        """
+
+        if not self._gemini_model:
+            return
+
+        first = None
+        try:
+            for attempt in range(self._RATE_LIMIT_RETRIES + 1):
+                # The slot only covers opening the request and reading its
+                # first chunk; the rest is read at the client's pace, and a
+                # slow or stalled reader must not starve other Gemini calls.
+                with self._request_slots:
+                    chunks = iter(
+                        self.client.models.generate_content_stream(
+                            model=self._text_model_id,
+                            contents=prompt,
+                            config=self._generation_config(system_instruction),
+                        )
+                    )
+                    try:
+                        # The request is sent when the first chunk is pulled.
+                        first = next(chunks, None)
+                        break
+                    except Exception as exc:
+                        if not self._should_retry(exc, attempt):
+                            raise
+                self._back_off(attempt)
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.warning('Gemini stream failed: %s', exc)
+            return
+
+        if first is None:
+            return
+        for chunk in chain((first,), chunks):
+            text = getattr(chunk, 'text', None)
+            if text:
+                yield text
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _generation_config(system_instruction: Optional[str]) -> Optional[types.GenerateContentConfig]:
+        """Send a persona as a system instruction so every turn shares the same prefix.
+
+        Memoized by instruction text: only a handful of personas exist, so each
+        config (and the system Content it wraps) is built once and reused.
+        """
+
+        if not system_instruction:
+            return None
+        return types.GenerateContentConfig(system_instruction=system_instruction)
 
+    @staticmethod
+    def _response_text(response: Any) -> str:
         if not response:
             return ''
 
@@ -1005,21 +1388,36 @@ class AIService:
             parts = getattr(content, 'parts', None) if content else None
             if not parts:
                 continue
-            assembled = ' '.join(getattr(part, 'text', '') for part in parts if getattr(part, 'text', ''))
-            if assembled.strip():
-                return assembled.strip()
+            assembled = ' '.join(part_text for part in parts if (part_text := getattr(part, 'text', None))).strip()
+            if assembled:
+                return assembled
 
         return ''
 
-    def _format_conversation(self, conversation: List[Dict[str, str]]) -> str:
-        lines = []
+    @staticmethod
+    def _with_summary(previous_summary: str, turns: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        if not previous_summary:
+            return turns
+        return [{'role': 'assistant', 'content': f'Summary of our earlier chat: {previous_summary}'}, *turns]
+
+    @staticmethod
+    def _prefix_digests(conversation: List[Dict[str, str]]) -> List[bytes]:
+        """Digest of every prefix of the conversation, built in one pass."""
+
+        hasher = hashlib.blake2b(digest_size=16)
+        digests: List[bytes] = []
         for message in conversation:
-            role = message.get('role', 'assistant')
-            prefix = 'User' if role == 'user' else 'Assistant'
-            content = (message.get('content') or '').strip()
-            if content:
-                lines.append(f"{prefix}: {content}")
-        return '\n'.join(lines) if lines else 'No prior context provided.'
+            hasher.update(f"{message.get('role')}\0{message.get('content') or ''}\0".encode())
+            digests.append(hasher.copy().digest())
+        return digests
+
+    def _format_conversation(self, conversation: List[Dict[str, str]]) -> str:
+        transcript = '\n'.join(
+            f"{'User' if message.get('role') == 'user' else 'Assistant'}: {content}"
+            for message in conversation
+            if (content := (message.get('content') or '').strip())
+        )
+        return transcript or 'No prior context provided.'
 
     def _format_logs(self, logs: List[Dict[str, Any]]) -> str:
         """Formats a list of log entries into a readable string."""
@@ -1028,10 +1426,9 @@ class AIService:
 
         lines = ["User's recent check-ins:"]
         for log in logs[-7:]:  # Limit to the last 7 logs to keep the prompt concise
-            ts = log.get('timestamp', 'N/A').split('T')[0]
-            details = [f"{k}: {v}" for k, v in log.items() if k != 'timestamp' and v]
+            details = "; ".join(f"{k}: {v}" for k, v in log.items() if k != 'timestamp' and v)
             if details:
-                lines.append(f"- On {ts}: " + "; ".join(details))
+                lines.append(f"- On {log.get('timestamp', 'N/A').partition('T')[0]}: {details}")
         return "\n".join(lines)
 
     def _summarize_conversation(self, conversation: List[Dict[str, str]]) -> str:
@@ -1040,44 +1437,97 @@ class AIService:
             return 'balanced health foundations with gentle progression'
 
         if self._gemini_model:
-            transcript = self._format_conversation(conversation)
-            prompt = (
-                "Summarize the following conversation transcript from a health and wellness onboarding session. "
-                "Focus on the user's goals, current habits, challenges, and any key personal details mentioned. "
-                "The summary should be concise, coherent, direct, and under 200 words.\n\n"
-                f"Transcript:\n{transcript}"
-            )
-            summary = self._call_gemini(prompt)
+            summary = self._gemini_summary(conversation)
+            if summary:
+                return summary
+
+        # Fallback to original heuristic if Gemini fails or is not configured.
+        return self._user_highlights(conversation) or 'holistic wellness focus'
+
+    def _gemini_summary(self, conversation: List[Dict[str, str]]) -> Optional[str]:
+        """Summarize ``conversation`` with Gemini, reusing the longest summarized prefix."""
+
+        digests = self._prefix_digests(conversation)
+        digest = digests[-1]
+        previous_summary, start = '', 0
+        with self._cache_lock:
+            summary = self._summaries.get(digest)
             if summary:
+                self._summaries.move_to_end(digest)
                 return summary
+            # Each turn only appends to the transcript, so fold the new
+            # messages into the summary of the longest known prefix.
+            for index in range(len(digests) - 2, -1, -1):
+                cached = self._summaries.get(digests[index])
+                if cached:
+                    previous_summary, start = cached, index + 1
+                    break
+
+        transcript = self._format_conversation(self._with_summary(previous_summary, conversation[start:]))
+        prompt = (
+            "Summarize the following conversation transcript from a health and wellness onboarding session. "
+            "Focus on the user's goals, current habits, challenges, and any key personal details mentioned. "
+            "The summary should be concise, coherent, direct, and under 200 words.\n\n"
+            f"Transcript:\n{transcript}"
+        )
+        summary = self._call_gemini(prompt)
+        if summary:
+            with self._cache_lock:
+                self._summaries[digest] = summary
+                if len(self._summaries) > self._SUMMARY_CACHE_SIZE:
+                    self._summaries.popitem(last=False)
+        return summary
+
+    @staticmethod
+    def _user_highlights(conversation: List[Dict[str, str]]) -> str:
+        """The last 500 characters the user wrote, or an empty string."""
+
+        # Only the last 500 characters are kept, so collect user messages from
+        # the end and stop once they cover that much.
+        user_highlights: List[str] = []
+        covered = -1
+        for item in reversed(conversation):
+            if item['role'] == 'user':
+                user_highlights.append(item['content'])
+                covered += len(item['content']) + 1
+                if covered >= 500:
+                    break
+        return ' '.join(reversed(user_highlights))[-500:]
+
+    @classmethod
+    def _plan_cues(cls, summary: str) -> frozenset:
+        """Labels from every fallback cue table whose words appear in ``summary``."""
+
+        return frozenset().union(
+            *(cls._PLAN_CUE_LABELS[match.group(1).lower()] for match in cls._PLAN_CUE_PATTERN.finditer(summary))
+        )
 
-        # Fallback to original heuristic if Gemini fails or is not configured
-        user_highlights = [item['content'] for item in conversation if item['role'] == 'user']
-        joined = ' '.join(user_highlights)
-        return joined[-500:] if joined else 'holistic wellness focus'
-
-    def _build_workout_split(self, summary: str) -> str:
-        if 'strength' in summary.lower():
-            return '4-day split: Upper / Lower / Mobility + Conditioning / Strength Skills'
-        if 'yoga' in summary.lower():
-            return '3-day flow: Vinyasa strength, Yin recovery, Mobility + Core'
-        return '3-day balanced: Full body strength, Low-impact cardio, Active recovery walk + core'
-
-    def _sample_session(self, summary: str) -> str:
-        if 'home' in summary.lower():
-            return 'Circuit: 3 rounds of air squats, incline push-ups, glute bridges, plank holds (40s on / 20s off).'
-        return 'Gym-based: Warm-up row 5 min, supersets of goblet squats + rows, RDLs + presses, finisher bike sprints.'
-
-    def _build_nutrition(self, summary: str) -> str:
-        if 'vegetarian' in summary.lower():
-            return 'Plate method with legumes, tofu, leafy greens, and omega-rich seeds.'
-        return 'Prioritize lean protein each meal, colorful veggies twice daily, smart carbs timed around workouts.'
-
-    def _calculate_consistency(self, logs) -> str:
+    @staticmethod
+    def _first_cue(cues: frozenset, table: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> Optional[str]:
+        return next((label for label, _ in table if label in cues), None)
+
+    @classmethod
+    def _build_workout_split(cls, cues: frozenset) -> str:
+        return cls._first_cue(cues, cls._WORKOUT_SPLIT_CUES) or cls._WORKOUT_SPLIT_DEFAULT
+
+    @classmethod
+    def _sample_session(cls, cues: frozenset) -> str:
+        return cls._first_cue(cues, cls._SAMPLE_SESSION_CUES) or cls._SAMPLE_SESSION_DEFAULT
+
+    @classmethod
+    def _build_nutrition(cls, cues: frozenset) -> str:
+        return cls._first_cue(cues, cls._NUTRITION_CUES) or cls._NUTRITION_DEFAULT
+
+    @staticmethod
+    def _calculate_consistency(logs) -> str:
         if not logs:
             return "building (let's establish routines)"
-        recent = logs[-5:]
-        workouts_logged = sum(1 for log in recent if log.get('workout'))
+        workouts_logged = 0
+        for log in islice(reversed(logs), 5):
+            if log.get('workout'):
+                workouts_logged += 1
+                if workouts_logged >= 4:
+                    break
         if workouts_logged >= 4:
             return 'excellent (momentum is strong)'
         if workouts_logged >= 2:
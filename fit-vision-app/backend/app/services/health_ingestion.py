@@ -416,7 +416,7 @@ class HealthDataIngestion:
                     # Extract numeric part and convert to float
                     hours = float(time_asleep_str.replace('h', ''))
                 except ValueError:
-                    logger.warning(f"Could not parse sleep_hours: {time_asleep_str}")
+                    logger.warning("Could not parse sleep_hours: %s", time_asleep_str)
             elif isinstance(time_asleep_str, (int, float)): # Handle if it's already numeric
                 hours = float(time_asleep_str)
 
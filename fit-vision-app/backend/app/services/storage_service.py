@@ -4,9 +4,11 @@ import json
 import os
 import logging
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, List, Optional
 from uuid import uuid4
 
 logger = logging.getLogger(__name__)
@@ -31,6 +33,8 @@ try:
 except Exception:  # pragma: no cover - optional dependency
     UpstashRedis = None  # type: ignore
 
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 class StorageService:
     """Persistence layer that defaults to filesystem storage for local testing."""
@@ -47,6 +51,10 @@ class StorageService:
         data_dir = Path(os.getenv('STORAGE_DATA_DIR', '/tmp/fitvision-data')).expanduser()
         data_dir.mkdir(parents=True, exist_ok=True)
         self._data_dir = data_dir.resolve()
+        # user_id -> lock serialising read-modify-write of the visualization
+        # document between request threads and the visualization worker.
+        self._visualization_locks: Dict[str, threading.Lock] = {}
+        self._visualization_locks_guard = threading.Lock()
 
     def sign_up(self, email: str, password: str, name: str) -> Dict[str, str]:
         if self._supabase:
@@ -296,6 +304,7 @@ class StorageService:
             self._log_path,
             self._conversation_path,
             self._coach_conversation_path,
+            self._coach_summary_path,
             self._visualizations_path,
             self._preferences_path,
         ):
@@ -389,6 +398,7 @@ class StorageService:
                         'conversation_type': 'onboarding',
                     }
                 ).execute()
+                return
             except Exception:
                 logger.warning('Supabase onboarding conversation save failed; using fallback', exc_info=True)
 
@@ -463,11 +473,55 @@ class StorageService:
                         'conversation_type': 'coach',
                     }
                 ).execute()
+                return
             except Exception:
                 logger.warning('Supabase coach conversation save failed; using fallback', exc_info=True)
 
         self._write_json(self._coach_conversation_path(user_id), conversation)
 
+    def fetch_coach_summary(self, user_id: str) -> Dict[str, Any]:
+        """Return the rolling summary of older coach turns, if one was saved."""
+
+        if self._supabase:
+            try:
+                response = (
+                    self._supabase.table('conversations')
+                    .select('history')
+                    .eq('user_id', user_id)
+                    .eq('conversation_type', 'coach_summary')
+                    .order('updated_at', desc=True)
+                    .limit(1)
+                    .execute()
+                )
+                if response.data and len(response.data) > 0:
+                    data = response.data[0].get('history')
+                    if isinstance(data, dict):
+                        return data
+            except Exception:
+                logger.warning('Supabase coach summary fetch failed; using fallback', exc_info=True)
+
+        data = self._read_json(self._coach_summary_path(user_id))
+        return data if isinstance(data, dict) else {}
+
+    def save_coach_summary(self, user_id: str, summary: Dict[str, Any]) -> None:
+        """Persist the rolling summary of older coach turns next to the coach chat."""
+
+        if self._supabase:
+            try:
+                self._supabase.table('conversations').upsert(
+                    {
+                        'user_id': user_id,
+                        'history': summary,
+                        'updated_at': datetime.now(timezone.utc).isoformat(),
+                        'conversation_type': 'coach_summary',
+                    }
+                ).execute()
+                return
+            except Exception:
+                logger.warning('Supabase coach summary save failed; using fallback', exc_info=True)
+
+        self._write_json(self._coach_summary_path(user_id), summary)
+
     def clear_coach_conversation(self, user_id: str) -> None:
         path = self._coach_conversation_path(user_id)
         if self._supabase:
@@ -655,15 +709,49 @@ class StorageService:
                 records.extend([item for item in data if isinstance(item, dict)])
         return records
 
-    def get_weekly_prompt(self, user_id: str) -> str:
-        logs = self.fetch_logs(user_id)
+    def get_weekly_prompt(self, user_id: str, logs: Optional[List[Dict]] = None) -> str:
+        """Return the check-in prompt built from the user's latest log.
+
+        The prompt is cheap to format, so it is rebuilt from current data on
+        every call rather than cached per process, where it would go stale as
+        soon as another instance writes a log. Callers that already hold the
+        user's logs can pass them to avoid a second fetch.
+        """
+
+        if logs is None:
+            logs = self.fetch_logs(user_id)
         if not logs:
-            return "It's a new week! Share one win and one challenge from the past few days."
-        latest = logs[-1]
-        return (
-            "How did the habits go after your last check-in on {date}? "
-            "Anything you'd like me to adjust?"
-        ).format(date=latest.get('timestamp', 'recently'))
+            prompt = "It's a new week! Share one win and one challenge from the past few days."
+        else:
+            latest = logs[-1]
+            prompt = (
+                "How did the habits go after your last check-in on {date}? "
+                "Anything you'd like me to adjust?"
+            ).format(date=latest.get('timestamp', 'recently'))
+        return prompt
+
+    def fetch_dashboard_bundle(self, user_id: str) -> Dict[str, Any]:
+        """Fetch the plan, logs, and weekly prompt rendered on the dashboard.
+
+        With Supabase configured the plan and log queries are independent
+        round-trips, so they run concurrently. The prompt is derived from the
+        fetched logs instead of querying them again.
+        """
+
+        if self._supabase:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                plan_future = executor.submit(self.fetch_plan, user_id)
+                logs_future = executor.submit(self.fetch_logs, user_id)
+                plan, logs = plan_future.result(), logs_future.result()
+        else:
+            plan = self.fetch_plan(user_id)
+            logs = self.fetch_logs(user_id)
+
+        return {
+            'plan': plan,
+            'logs': logs,
+            'weekly_prompt': self.get_weekly_prompt(user_id, logs=logs),
+        }
 
     # --- Normalized health data --------------------------------------
 
@@ -725,17 +813,38 @@ class StorageService:
         if not image_bytes:
             raise ValueError("No image data provided")
 
-        safe_ext = (ext or "png").lstrip(".") or "png"
-        directory = self.user_images_dir(user_id)
-        filename = f"{uuid4().hex}.{safe_ext}"
-        path = directory / filename
+        path = self._new_visualization_path(user_id, ext)
         path.write_bytes(image_bytes)
-        created_at = datetime.now(timezone.utc).isoformat()
+        return self._visualization_image_metadata(user_id, path)
+
+    def save_visualization_stream(self, user_id: str, stream: BinaryIO, ext: str = "jpg") -> Dict[str, str]:
+        """Copy an uploaded image stream straight to disk and return metadata.
+
+        The upload is written in 1 MiB chunks so large photos never have to be
+        buffered in memory before they land in their final location.
+        """
+
+        path = self._new_visualization_path(user_id, ext)
+        with path.open("wb") as handle:
+            shutil.copyfileobj(stream, handle, length=_UPLOAD_CHUNK_SIZE)
+            written = handle.tell()
+
+        if not written:
+            path.unlink(missing_ok=True)
+            raise ValueError("No image data provided")
+
+        return self._visualization_image_metadata(user_id, path)
 
+    def _new_visualization_path(self, user_id: str, ext: str) -> Path:
+        safe_ext = (ext or "png").lstrip(".") or "png"
+        return self.user_images_dir(user_id) / f"{uuid4().hex}.{safe_ext}"
+
+    def _visualization_image_metadata(self, user_id: str, path: Path) -> Dict[str, str]:
+        filename = path.name
         return {
             "key": f"{user_id}/{filename}",
             "url": f"/user-images/{user_id}/{filename}",
-            "created_at": created_at,
+            "created_at": datetime.now(timezone.utc).isoformat(),
             "path": str(path),
         }
 
@@ -757,9 +866,37 @@ class StorageService:
                 logger.warning('Supabase visualization record failed; using fallback', exc_info=True)
 
         # Fallback to local JSON storage
-        entries = self._load_visualizations(user_id)
-        entries.append(meta)
-        self._write_json(self._visualizations_path(user_id), entries)
+        with self._visualization_lock(user_id):
+            entries = self._load_visualizations(user_id)
+            entries.append(meta)
+            self._write_json(self._visualizations_path(user_id), entries)
+
+    def update_visualization_metadata(self, user_id: str, visualization_id: str, updates: Dict) -> Optional[Dict]:
+        """Merge ``updates`` into a stored visualization entry and return it."""
+
+        if self._supabase:
+            try:
+                query = self._supabase.table('visualizations').select('id, metadata').eq('user_id', user_id)
+                response = query.eq('metadata->>id', visualization_id).limit(1).execute()
+                if response.data:
+                    row = response.data[0]
+                    meta = {**(row.get('metadata') or {}), **updates}
+                    record: Dict[str, Any] = {'metadata': meta}
+                    if 'url' in updates:
+                        record['generated_image_url'] = updates['url']
+                    self._supabase.table('visualizations').update(record).eq('id', row['id']).execute()
+                    return meta
+            except Exception:
+                logger.warning('Supabase visualization update failed; using fallback', exc_info=True)
+
+        with self._visualization_lock(user_id):
+            entries = self._load_visualizations(user_id)
+            for entry in entries:
+                if entry.get('id') == visualization_id:
+                    entry.update(updates)
+                    self._write_json(self._visualizations_path(user_id), entries)
+                    return entry
+        return None
 
     def list_visualizations(self, user_id: str, limit: int = 20) -> List[Dict]:
         """Return visualization metadata records for a user."""
@@ -811,17 +948,45 @@ class StorageService:
         return None
 
     def remove_visualization(self, user_id: str, visualization_id: str) -> Optional[Dict]:
-        items = self._load_visualizations(user_id)
-        remaining: List[Dict] = []
-        removed: Optional[Dict] = None
-        for item in items:
-            if isinstance(item, dict) and item.get("id") == visualization_id and removed is None:
-                removed = self._normalise_visualization_entry(user_id, item)
-                continue
-            remaining.append(item)
-        self._write_json(self._visualizations_path(user_id), remaining)
+        with self._visualization_lock(user_id):
+            items = self._load_visualizations(user_id)
+            remaining: List[Dict] = []
+            removed: Optional[Dict] = None
+            for item in items:
+                if isinstance(item, dict) and item.get("id") == visualization_id and removed is None:
+                    removed = self._normalise_visualization_entry(user_id, item)
+                    continue
+                remaining.append(item)
+            self._write_json(self._visualizations_path(user_id), remaining)
         return removed
 
+    def delete_visualization_files(self, user_id: str, entry: Dict) -> int:
+        """Unlink every image file referenced by a removed visualization entry.
+
+        Covers the stored paths and legacy entries that only keep filenames
+        inside the user's image directory. Returns the number of files removed.
+        """
+
+        directory = self.user_images_dir(user_id)
+        targets = {
+            Path(path_value)
+            for path_value in (entry.get("storage_path"), entry.get("original_storage_path"))
+            if path_value
+        }
+        for key in ("original", "future"):
+            filename = entry.get(key)
+            if filename:
+                targets.add(directory / Path(filename).name)
+
+        deleted = 0
+        for path in targets:
+            try:
+                path.unlink()
+                deleted += 1
+            except FileNotFoundError:
+                continue
+        return deleted
+
     def visualization_image_dir(self, user_id: str) -> Path:
         return self.user_images_dir(user_id)
 
@@ -907,7 +1072,15 @@ class StorageService:
                 logger.warning('Redis write failed; using filesystem fallback', exc_info=True)
 
         path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(json.dumps(data, indent=2))
+        # Write a sibling temp file and swap it in so readers (including the
+        # visualization worker thread) never see a half-written document.
+        tmp_path = path.with_name(f"{path.name}.{uuid4().hex}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(data, indent=2))
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            raise
 
     def _read_json(self, path: Path):
         if self._redis is not None:
@@ -954,6 +1127,9 @@ class StorageService:
     def _coach_conversation_path(self, user_id: str) -> Path:
         return self._data_dir / f'{user_id}_coach_conversation.json'
 
+    def _coach_summary_path(self, user_id: str) -> Path:
+        return self._data_dir / f'{user_id}_coach_summary.json'
+
     def _preferences_path(self, user_id: str) -> Path:
         return self._data_dir / f'{user_id}_preferences.json'
 
@@ -969,6 +1145,17 @@ class StorageService:
                 return value
         return None
 
+    def _visualization_lock(self, user_id: str) -> threading.Lock:
+        """Lock guarding a user's visualization document.
+
+        ``_write_json`` makes each write atomic, but a load-mutate-write from
+        one thread can still overwrite another's; every read-modify-write of
+        the document holds this lock.
+        """
+
+        with self._visualization_locks_guard:
+            return self._visualization_locks.setdefault(user_id, threading.Lock())
+
     def _load_visualizations(self, user_id: str) -> List[Dict]:
         data = self._read_json(self._visualizations_path(user_id))
         if isinstance(data, list):
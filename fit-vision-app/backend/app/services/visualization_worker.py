@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from queue import Queue
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class VisualizationWorker:
+    """Background generation of future-self visualizations.
+
+    The image model call takes several seconds, so ``visualize()`` records a
+    pending entry and hands the job to this worker instead of holding the
+    request open. The worker saves the generated image and flips the stored
+    entry to ``ready`` (or ``failed``) so the page can poll for completion.
+    When no image comes back, the entry reuses the uploaded original.
+
+    Queued jobs live in process memory only. Serverless runtimes, which freeze
+    the process after each response, do not attach a worker, so ``visualize()``
+    calls ``process()`` inline there.
+    """
+
+    def __init__(self, storage_service, ai_service) -> None:
+        self._storage = storage_service
+        self._ai = ai_service
+        self._queue: "Queue[Dict[str, Any]]" = Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start_background_tasks(self) -> None:
+        """Start the worker thread if it is not already running."""
+
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._worker_loop, daemon=True)
+                self._worker.start()
+
+    def enqueue(self, job: Dict[str, Any]) -> None:
+        if not job:
+            return
+        self.start_background_tasks()
+        self._queue.put(job)
+
+    def join(self) -> None:
+        """Block until every queued job has been processed."""
+
+        self._queue.join()
+
+    def _worker_loop(self) -> None:  # pragma: no cover - background thread
+        while True:
+            job = self._queue.get()
+            try:
+                self.process(job)
+            finally:
+                self._queue.task_done()
+
+    def process(self, job: Dict[str, Any]) -> None:
+        """Generate, persist, and publish a single visualization job.
+
+        Never raises: any unexpected error marks the entry ``failed`` so the
+        page stops waiting on it.
+        """
+
+        try:
+            self._process(job)
+        except Exception:
+            logger.warning("visualization_worker.process_failed", exc_info=True, extra={"viz_id": job.get("id")})
+            try:
+                self._storage.update_visualization_metadata(job["user_id"], job["id"], {"status": "failed"})
+            except Exception:
+                logger.warning("visualization_worker.mark_failed_failed", exc_info=True, extra={"viz_id": job.get("id")})
+
+    def _process(self, job: Dict[str, Any]) -> None:
+        user_id = job["user_id"]
+        viz_id = job["id"]
+        original_path = Path(job["original_path"])
+
+        try:
+            generated = self._ai.generate_visualization(original_path, dict(job.get("context") or {}))
+        except Exception:
+            logger.warning("visualization_worker.generate_failed", exc_info=True, extra={"viz_id": viz_id})
+            generated = None
+        generated_bytes = self._decode_image(generated)
+
+        if not generated_bytes:
+            # Show the original in the "future" slot rather than writing a copy.
+            self._storage.update_visualization_metadata(
+                user_id,
+                viz_id,
+                {
+                    "status": "ready",
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "key": job.get("original_key"),
+                    "url": job.get("original_url"),
+                    "storage_path": str(original_path),
+                },
+            )
+            return
+
+        try:
+            future_saved = self._storage.save_visualization_image(user_id, generated_bytes, ext="png")
+        except Exception:
+            logger.exception("visualization_worker.save_failed", extra={"viz_id": viz_id})
+            self._storage.update_visualization_metadata(user_id, viz_id, {"status": "failed"})
+            return
+
+        self._storage.update_visualization_metadata(
+            user_id,
+            viz_id,
+            {
+                "status": "ready",
+                "created_at": future_saved.get("created_at"),
+                "hash": hashlib.md5(generated_bytes).hexdigest(),
+                "key": future_saved.get("key"),
+                "url": future_saved.get("url"),
+                "storage_path": future_saved.get("path"),
+            },
+        )
+
+    @staticmethod
+    def _decode_image(payload: Any) -> Optional[bytes]:
+        if isinstance(payload, dict):
+            payload = payload.get("image_base64")
+            if not payload:
+                return None
+        if isinstance(payload, str):
+            try:
+                return base64.b64decode(payload.split(",")[-1])
+            except Exception:
+                logger.warning("visualization_worker.decode_failed")
+                return None
+        if isinstance(payload, (bytes, bytearray)):
+            return bytes(payload)
+        return None
@@ -0,0 +1,105 @@
+(function() {
+  function appendMessage(feed, role, text) {
+    var wrapper = document.createElement('div');
+    var meta = document.createElement('div');
+    meta.className = 'message-meta';
+    meta.textContent = role;
+    var bubble = document.createElement('div');
+    bubble.className = 'message-bubble message-bubble--' + role;
+    bubble.textContent = text;
+    wrapper.appendChild(meta);
+    wrapper.appendChild(bubble);
+    feed.appendChild(wrapper);
+    return bubble;
+  }
+
+  function readEvents(response, onData) {
+    var reader = response.body.getReader();
+    var decoder = new TextDecoder();
+    var buffer = '';
+
+    function pump() {
+      return reader.read().then(function(result) {
+        if (result.done) {
+          return;
+        }
+        buffer += decoder.decode(result.value, { stream: true });
+        var events = buffer.split('\n\n');
+        buffer = events.pop();
+        events.forEach(function(event) {
+          if (event.indexOf('event: error') === 0) {
+            throw new Error('stream interrupted');
+          }
+          if (event.indexOf('data: ') === 0 && event.indexOf('event:') === -1) {
+            onData(JSON.parse(event.slice(6)));
+          }
+        });
+        return pump();
+      });
+    }
+
+    return pump();
+  }
+
+  function init() {
+    var form = document.querySelector('form[data-stream-url]');
+    var feed = document.querySelector('.message-feed');
+    if (!form || !feed || !window.fetch || !window.TextDecoder || !window.ReadableStream) {
+      return;
+    }
+
+    var input = form.querySelector('textarea[name="message"]');
+    var sendButton = form.querySelector('button[type="submit"]');
+    var inFlight = false;
+
+    form.addEventListener('submit', function(event) {
+      // One reply at a time: Enter or a second button would otherwise start
+      // an overlapping stream for the same conversation.
+      if (inFlight) {
+        event.preventDefault();
+        return;
+      }
+      var message = input.value.trim();
+      if (!message || (event.submitter && event.submitter.hasAttribute('data-stream-skip'))) {
+        return;
+      }
+      event.preventDefault();
+
+      var body = new FormData(form);
+      appendMessage(feed, 'user', message);
+      var reply = appendMessage(feed, 'assistant', '');
+      input.value = '';
+      inFlight = true;
+      sendButton.disabled = true;
+
+      fetch(form.getAttribute('data-stream-url'), {
+        method: 'POST',
+        body: body,
+        credentials: 'same-origin'
+      })
+        .then(function(response) {
+          if (!response.ok || !response.body) {
+            throw new Error('stream unavailable');
+          }
+          return readEvents(response, function(chunk) {
+            reply.textContent += chunk;
+            feed.scrollTop = feed.scrollHeight;
+          });
+        })
+        .catch(function() {
+          // Fall back to the server-rendered conversation.
+          window.location.reload();
+        })
+        .then(function() {
+          inFlight = false;
+          sendButton.disabled = false;
+        });
+    });
+  }
+
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', init);
+  } else {
+    init();
+  }
+})();
@@ -0,0 +1,57 @@
+(function() {
+  var POLL_INTERVAL_MS = 3000;
+  // Stop after ~10 minutes; the server reports jobs pending that long as failed.
+  var MAX_POLLS = 200;
+
+  function init() {
+    var pending = document.querySelectorAll('[data-viz-status-url]');
+    if (!pending.length) {
+      return;
+    }
+
+    var polls = 0;
+    var urls = [];
+    pending.forEach(function(node) {
+      urls.push(node.getAttribute('data-viz-status-url'));
+    });
+
+    function poll() {
+      Promise.all(urls.map(function(url) {
+        return fetch(url, { credentials: 'same-origin' })
+          .then(function(response) {
+            if (response.status === 404) {
+              return { status: 'missing' };
+            }
+            if (response.status === 401) {
+              // Session expired: reloading sends the user to log in.
+              return { status: 'unauthorized' };
+            }
+            return response.ok ? response.json() : { status: 'pending' };
+          })
+          .catch(function() {
+            return { status: 'pending' };
+          });
+      })).then(function(results) {
+        var settled = results.some(function(result) {
+          return result.status !== 'pending';
+        });
+        if (settled) {
+          window.location.reload();
+          return;
+        }
+        polls += 1;
+        if (polls < MAX_POLLS) {
+          window.setTimeout(poll, POLL_INTERVAL_MS);
+        }
+      });
+    }
+
+    window.setTimeout(poll, POLL_INTERVAL_MS);
+  }
+
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', init);
+  } else {
+    init();
+  }
+})();
@@ -3,10 +3,15 @@ from __future__ import annotations
 import os
 import sys
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from types import ModuleType
 from unittest import TestCase
 from unittest.mock import patch, call
 
+from flask import jsonify
+from jinja2 import FileSystemBytecodeCache
+import orjson
+
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
@@ -36,7 +41,7 @@ class _DummyPart:
 stub_types.Part = _DummyPart
 sys.modules.setdefault("google.genai.types", stub_types)
 
-from app import create_app
+from app import ORJSONProvider, create_app
 
 
 class AppFactoryDatabaseTests(TestCase):
@@ -75,3 +80,45 @@ class AppFactoryDatabaseTests(TestCase):
         self.assertEqual("redis", app.config["SESSION_TYPE"])
         self.assertIs(app.config["SESSION_REDIS"], fake_client)
         mock_session.assert_called_once()
+
+    def test_json_provider_falls_back_without_orjson(self) -> None:
+        with patch("app.orjson", None):
+            app = create_app()
+
+        self.assertNotIsInstance(app.json, ORJSONProvider)
+        with app.app_context():
+            self.assertEqual('{"a": 1}', app.json.dumps({"a": 1}))
+
+    def test_jsonify_responses_are_serialized_with_orjson(self) -> None:
+        app = create_app()
+
+        with patch("app.orjson.dumps", wraps=orjson.dumps) as mock_dumps, app.app_context():
+            compact = jsonify(b=[1, 2])
+            app.json.compact = False
+            indented = jsonify(b=[1, 2])
+
+        self.assertEqual(mock_dumps.call_count, 2)
+        self.assertEqual(b'{"b":[1,2]}\n', compact.get_data())
+        self.assertEqual(b'{\n  "b": [\n    1,\n    2\n  ]\n}\n', indented.get_data())
+        self.assertTrue(mock_dumps.call_args.kwargs["option"] & orjson.OPT_INDENT_2)
+
+    def test_unmodified_sessions_are_not_rewritten(self) -> None:
+        app = create_app()
+        app.config["TESTING"] = True
+
+        with app.test_client() as client:
+            with client.session_transaction() as flask_session:
+                flask_session["user"] = {"id": "user-1"}
+            response = client.get("/login")
+
+        self.assertFalse(app.config["SESSION_REFRESH_EACH_REQUEST"])
+        self.assertNotIn("Set-Cookie", response.headers)
+
+    def test_templates_use_filesystem_bytecode_cache(self) -> None:
+        with TemporaryDirectory() as tmpdir:
+            with patch.dict(os.environ, {"JINJA_CACHE_DIR": tmpdir}, clear=False):
+                app = create_app()
+
+            self.assertIsInstance(app.jinja_env.bytecode_cache, FileSystemBytecodeCache)
+            app.jinja_env.get_template("index.html")
+            self.assertTrue(any(Path(tmpdir).iterdir()))
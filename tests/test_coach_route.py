@@ -2,10 +2,13 @@ from __future__ import annotations
 
 from contextlib import contextmanager
 import sys
-from types import ModuleType
+import threading
+from types import ModuleType, SimpleNamespace
 from typing import Dict, List
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
+
+from flask import session
 
 
 stub_google = sys.modules.setdefault('google', ModuleType('google'))
@@ -35,6 +38,7 @@ sys.modules.setdefault('google.genai.types', stub_types)
 
 
 from app import create_app
+import app.routes as routes
 from app.routes import ai_service, storage_service
 from app.services.ai_service import AIService
 
@@ -121,6 +125,218 @@ class CoachRouteTests(TestCase):
         self.assertEqual(saved_conversation[0]['content'], 'Still onboarding.')
         self.assertEqual(saved_conversation[1]['content'], "Let's keep gathering details.")
 
+    @contextmanager
+    def stored_conversations(self, fetch_name: str, save_name: str, initial: List[Dict[str, str]]):
+        """Back ``fetch_name``/``save_name`` with an in-memory store; yields its save history."""
+
+        saves: List[List[Dict[str, str]]] = [list(initial)]
+
+        def save(user_id, conversation):
+            saves.append(list(conversation))
+
+        with patch.object(storage_service, fetch_name, side_effect=lambda user_id: list(saves[-1])), patch.object(
+            storage_service, save_name, side_effect=save
+        ):
+            yield saves
+
+    def test_stream_sends_reply_chunks_and_saves_conversation(self) -> None:
+        user = {'id': 'user-789', 'name': 'Robin', 'onboarding_complete': True}
+        history = [{'role': 'assistant', 'content': 'How was the week?'}]
+        stored_before_reply: List[List[Dict[str, str]]] = []
+
+        def stream(conversation, user):
+            stored_before_reply.append(saves[-1])
+            yield 'Nice '
+            yield 'work!'
+
+        with patched_session(self.client, {'user': user, 'coach_conversation': history}):
+            pass
+
+        with self.stored_conversations(
+            'fetch_coach_conversation', 'save_coach_conversation', history
+        ) as saves, patch.object(ai_service, 'stream_check_in', side_effect=stream) as mock_stream:
+            response = self.client.post('/coach/stream', data={'message': 'Hit every session.'})
+            body = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(body, 'data: "Nice "\n\ndata: "work!"\n\nevent: done\ndata: {}\n\n')
+        self.assertEqual(mock_stream.call_args[0][0][-1]['content'], 'Hit every session.')
+
+        # The user's turn is stored before the reply streams, so a reload mid-stream shows it.
+        self.assertEqual(stored_before_reply[0][1:], [{'role': 'user', 'content': 'Hit every session.'}])
+        self.assertEqual(
+            saves[-1][1:],
+            [
+                {'role': 'user', 'content': 'Hit every session.'},
+                {'role': 'assistant', 'content': 'Nice work!'},
+            ],
+        )
+        with self.client.session_transaction() as flask_session:
+            self.assertNotIn('coach_conversation', flask_session)
+
+    def test_interrupted_stream_sends_an_error_event_and_keeps_only_the_user_turn(self) -> None:
+        user = {'id': 'user-791', 'name': 'Robin', 'onboarding_complete': True}
+
+        def broken_stream(conversation, user):
+            yield 'Half a '
+            raise ConnectionError('reset by peer')
+
+        with patched_session(self.client, {'user': user}):
+            pass
+
+        with self.stored_conversations('fetch_coach_conversation', 'save_coach_conversation', []) as saves, patch.object(
+            ai_service, 'stream_check_in', side_effect=broken_stream
+        ):
+            body = self.client.post('/coach/stream', data={'message': 'Plan my week'}).get_data(as_text=True)
+
+        self.assertEqual(body, 'data: "Half a "\n\nevent: error\ndata: {}\n\n')
+        self.assertEqual(saves[-1], [{'role': 'user', 'content': 'Plan my week'}])
+
+    def test_overlapping_streams_keep_every_turn(self) -> None:
+        user = {'id': 'user-790', 'name': 'Robin', 'onboarding_complete': True}
+
+        def first_stream(conversation, user):
+            # A second message arrives and finishes while this reply is still streaming.
+            self.client.post('/coach/stream', data={'message': 'Second'}).get_data()
+            yield 'First reply'
+
+        with patched_session(self.client, {'user': user}):
+            pass
+
+        with self.stored_conversations('fetch_coach_conversation', 'save_coach_conversation', []) as saves, patch.object(
+            ai_service, 'stream_check_in', side_effect=[first_stream(None, user), iter(['Second reply'])]
+        ):
+            self.client.post('/coach/stream', data={'message': 'First'}).get_data()
+
+        self.assertEqual(
+            [message['content'] for message in saves[-1]],
+            ['First', 'Second', 'Second reply', 'First reply'],
+        )
+
+    def test_onboarding_stream_sends_question_chunks_and_saves_conversation(self) -> None:
+        user = {'id': 'user-987', 'name': 'Casey', 'onboarding_complete': False}
+        history = [{'role': 'assistant', 'content': 'What does a typical week look like?'}]
+
+        with patched_session(self.client, {'user': user, 'onboarding_conversation': history}):
+            pass
+
+        with patch('app.routes._onboarding_complete', return_value=False), self.stored_conversations(
+            'fetch_conversation', 'save_conversation', history
+        ) as saves, patch.object(
+            ai_service, 'stream_continue_onboarding', return_value=iter(['How do ', 'you sleep?'])
+        ) as mock_stream:
+            response = self.client.post('/onboarding/stream', data={'message': 'I run twice a week.'})
+            body = response.get_data(as_text=True)
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(body, 'data: "How do "\n\ndata: "you sleep?"\n\nevent: done\ndata: {}\n\n')
+        self.assertEqual(mock_stream.call_args[0][0][-1]['content'], 'I run twice a week.')
+
+        self.assertEqual(saves[1][1:], [{'role': 'user', 'content': 'I run twice a week.'}])
+        self.assertEqual(
+            saves[-1][1:],
+            [
+                {'role': 'user', 'content': 'I run twice a week.'},
+                {'role': 'assistant', 'content': 'How do you sleep?'},
+            ],
+        )
+        with self.client.session_transaction() as flask_session:
+            self.assertNotIn('onboarding_conversation', flask_session)
+
+    def test_check_in_receives_only_recent_turns(self) -> None:
+        user = {'id': 'user-321', 'name': 'Jamie', 'onboarding_complete': True}
+        history = [
+            {'role': 'user' if index % 2 == 0 else 'assistant', 'content': f'message {index}'}
+            for index in range(40)
+        ]
+
+        with patched_session(self.client, {'user': user, 'coach_conversation': history}):
+            pass
+
+        with patch.object(storage_service, 'save_coach_conversation') as mock_save, patch.object(
+            storage_service, 'fetch_coach_summary', return_value={'turns': 19, 'summary': 'Talked about squats.'}
+        ), patch.object(storage_service, 'save_coach_summary'), patch.object(
+            ai_service, 'check_in', return_value='Nice work!'
+        ) as mock_check_in, patch.object(ai_service, 'roll_summary', return_value='Talked about lunges.'):
+            self.client.post('/coach', data={'message': 'Latest update'})
+
+        sent_conversation = mock_check_in.call_args[0][0]
+        self.assertEqual(len(sent_conversation), 21)
+        self.assertEqual(sent_conversation[0]['content'], 'Earlier in our chat: Talked about squats.')
+        self.assertEqual(sent_conversation[-1]['content'], 'Latest update')
+        self.assertEqual(len(mock_save.call_args[0][1]), 42)
+
+    def test_history_summary_is_reused_until_enough_turns_age_out(self) -> None:
+        user = {'id': 'user-654', 'name': 'Drew', 'onboarding_complete': True}
+        history = [
+            {'role': 'user' if index % 2 == 0 else 'assistant', 'content': f'message {index}'}
+            for index in range(30)
+        ]
+        stored: Dict[str, Dict[str, object]] = {}
+
+        with patched_session(self.client, {'user': user, 'coach_conversation': history}):
+            pass
+
+        with patch.object(storage_service, 'save_coach_conversation'), patch.object(
+            storage_service, 'fetch_coach_summary', side_effect=lambda user_id: stored.get(user_id, {})
+        ), patch.object(
+            storage_service, 'save_coach_summary', side_effect=stored.__setitem__
+        ), patch.object(ai_service, 'check_in', return_value='Noted.'), patch.object(
+            ai_service, 'roll_summary', side_effect=['first', 'second']
+        ) as mock_roll:
+            for index in range(6):
+                self.client.post('/coach', data={'message': f'update {index}'})
+
+        # 12 older messages after the first reply, then a refresh once 10 more aged out.
+        self.assertEqual(mock_roll.call_count, 2)
+        self.assertEqual(mock_roll.call_args_list[0][0], ('', history[:12]))
+        self.assertEqual(mock_roll.call_args_list[1][0][0], 'first')
+        self.assertEqual(len(mock_roll.call_args_list[1][0][1]), 10)
+        self.assertEqual(stored['user-654'], {'turns': 22, 'summary': 'second'})
+
+    def test_stream_refreshes_history_summary_after_the_reply(self) -> None:
+        user = {'id': 'user-655', 'name': 'Drew', 'onboarding_complete': True}
+        history = [
+            {'role': 'user' if index % 2 == 0 else 'assistant', 'content': f'message {index}'}
+            for index in range(30)
+        ]
+        events: List[str] = []
+
+        def stream(conversation, user):
+            events.append('reply')
+            yield 'Noted.'
+
+        def roll(previous_summary, turns):
+            events.append('summary')
+            return 'rolled'
+
+        with patched_session(self.client, {'user': user, 'coach_conversation': history}):
+            pass
+
+        with self.stored_conversations('fetch_coach_conversation', 'save_coach_conversation', history), patch.object(
+            storage_service, 'fetch_coach_summary', return_value={}
+        ), patch.object(storage_service, 'save_coach_summary') as mock_save_summary, patch.object(
+            ai_service, 'stream_check_in', side_effect=stream
+        ) as mock_stream, patch.object(ai_service, 'roll_summary', side_effect=roll):
+            response = self.client.post('/coach/stream', data={'message': 'update'})
+            response.get_data()
+
+        self.assertEqual(events, ['reply', 'summary'])
+        self.assertEqual(len(mock_stream.call_args[0][0]), 20)
+        mock_save_summary.assert_called_once_with('user-655', {'turns': 12, 'summary': 'rolled'})
+
+    def test_onboarding_lookup_runs_once_per_request(self) -> None:
+        user = {'id': 'user-789', 'name': 'Casey', 'onboarding_complete': False}
+
+        with patch.object(storage_service, 'fetch_plan', return_value={}) as mock_fetch_plan:
+            with self.app.test_request_context('/coach'):
+                session['user'] = dict(user)
+                self.assertFalse(routes._onboarding_complete())
+                self.assertFalse(routes._onboarding_complete())
+
+        mock_fetch_plan.assert_called_once_with('user-789')
+
 
 class AIServiceCheckInTests(TestCase):
     def setUp(self) -> None:
@@ -138,7 +354,7 @@ class AIServiceCheckInTests(TestCase):
 
         self.assertEqual(result, 'All good!')
         mock_build.assert_called_once_with(conversation, user)
-        mock_call.assert_called_once_with('prompt')
+        mock_call.assert_called_once_with('prompt', system_instruction=AIService._CHECK_IN_PREAMBLE)
 
     def test_check_in_falls_back_when_gemini_empty(self) -> None:
         conversation = [{'role': 'user', 'content': 'Need some help.'}]
@@ -163,3 +379,287 @@ class AIServiceCheckInTests(TestCase):
 
         self.assertEqual(result, 'Fallback reply')
         mock_fallback.assert_called_once_with(conversation, user)
+
+
+class AIServiceRollSummaryTests(TestCase):
+    def test_fallback_keeps_the_previous_summary(self) -> None:
+        service = AIService()
+        service._gemini_model = None
+        turns = [
+            {'role': 'user', 'content': 'My knee hurts on stairs.'},
+            {'role': 'assistant', 'content': 'Try step-ups with a low box.'},
+        ]
+
+        summary = service.roll_summary('Training for a 10k.', turns)
+
+        self.assertEqual(summary, 'Training for a 10k. My knee hurts on stairs.')
+
+    def test_fallback_is_used_when_gemini_returns_nothing(self) -> None:
+        service = AIService()
+        service._gemini_model = object()
+
+        with patch.object(service, '_call_gemini', return_value='') as mock_call:
+            summary = service.roll_summary('x' * 1200, [{'role': 'user', 'content': 'Sleeping better.'}])
+
+        mock_call.assert_called_once()
+        self.assertEqual(len(summary), AIService._ROLLING_SUMMARY_CHARS)
+        self.assertTrue(summary.endswith('x Sleeping better.'))
+
+
+class AIServiceOnboardingStreamTests(TestCase):
+    def test_stream_falls_back_to_heuristic_question(self) -> None:
+        service = AIService()
+        service._gemini_model = True
+        conversation = [{'role': 'user', 'content': 'I lift weights.'}]
+
+        with patch.object(service, '_build_onboarding_prompt', return_value='prompt'), patch.object(
+            service, '_stream_gemini', return_value=iter([])
+        ) as mock_stream, patch.object(
+            service, '_fallback_onboarding_question', return_value='How is your sleep?'
+        ):
+            chunks = list(service.stream_continue_onboarding(conversation, {'name': 'Lee'}))
+
+        self.assertEqual(chunks, ['How is your sleep?'])
+        mock_stream.assert_called_once_with('prompt', system_instruction=AIService._ONBOARDING_PREAMBLE)
+
+
+class AIServiceTopicsStateTests(TestCase):
+    def setUp(self) -> None:
+        self.service = AIService()
+
+    def test_topics_match_substrings_case_insensitively(self) -> None:
+        conversation = [
+            {'role': 'user', 'content': 'I love Running with my TEAMMATES.'},
+            {'role': 'assistant', 'content': 'How have you slept lately?'},
+            {'role': 'user', 'content': None},
+        ]
+
+        state = self.service._topics_state(conversation)
+
+        self.assertEqual(state['covered'], ['sleep', 'exercise', 'socialization'])
+        self.assertEqual(state['remaining'][0], 'physical_profile')
+
+    def test_keyword_prefixes_credit_every_topic(self) -> None:
+        state = self.service._topics_state([{'role': 'user', 'content': 'Workouts'}])
+
+        self.assertEqual(state['covered'], ['activity', 'exercise'])
+
+    def test_previously_seen_messages_are_not_rescanned(self) -> None:
+        conversation = [{'role': 'user', 'content': 'Stress at work keeps me up at night, zzz-unique-1'}]
+        self.service._topics_state(conversation)
+
+        conversation.append({'role': 'user', 'content': 'I eat a lot of protein, zzz-unique-2'})
+        before = AIService._message_topics.cache_info()
+        state = self.service._topics_state(conversation)
+        after = AIService._message_topics.cache_info()
+
+        self.assertEqual(after.hits - before.hits, 1)
+        self.assertEqual(after.misses - before.misses, 1)
+        self.assertEqual(state['covered'], ['stress', 'diet'])
+
+
+class AIServiceClientTests(TestCase):
+    def test_client_is_built_once_on_first_use(self) -> None:
+        with patch.dict('os.environ', {'GEMINI_API_KEY': 'test-key'}), patch(
+            'app.services.ai_service.genai.Client'
+        ) as mock_client:
+            service = AIService()
+            mock_client.assert_not_called()
+
+            self.assertIs(service.client, service.client)
+
+        mock_client.assert_called_once_with(api_key='test-key')
+        self.assertTrue(service._gemini_model)
+
+    def test_response_cache_reuses_identical_prompts_when_enabled(self) -> None:
+        with patch.dict('os.environ', {'AI_RESPONSE_CACHE': '1'}):
+            service = AIService()
+        service._gemini_model = True
+        generate = MagicMock(return_value=SimpleNamespace(text='Cached reply'))
+        service.client = SimpleNamespace(models=SimpleNamespace(generate_content=generate))
+
+        self.assertEqual(service._call_gemini('same prompt'), 'Cached reply')
+        self.assertEqual(service._call_gemini('same prompt'), 'Cached reply')
+        self.assertEqual(generate.call_count, 1)
+
+        service._call_gemini('another prompt')
+        self.assertEqual(generate.call_count, 2)
+
+    def test_rate_limited_requests_are_retried_with_backoff(self) -> None:
+        service = AIService()
+        service._gemini_model = True
+        rate_limited = Exception('429 RESOURCE_EXHAUSTED')
+        rate_limited.code = 429
+        generate = MagicMock(side_effect=[rate_limited, rate_limited, SimpleNamespace(text='Finally')])
+        service.client = SimpleNamespace(models=SimpleNamespace(generate_content=generate))
+
+        with patch('app.services.ai_service.time.sleep') as mock_sleep:
+            self.assertEqual(service._call_gemini('busy prompt'), 'Finally')
+
+        self.assertEqual(generate.call_count, 3)
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [1.0, 2.0])
+
+    def test_stream_is_retried_on_rate_limit_and_frees_its_slot_after_the_first_chunk(self) -> None:
+        service = AIService()
+        service._gemini_model = True
+        service._request_slots = threading.BoundedSemaphore(1)
+        rate_limited = Exception('429 RESOURCE_EXHAUSTED')
+        rate_limited.code = 429
+        slot_free_while_streaming: List[bool] = []
+
+        def rejected_stream():
+            raise rate_limited
+            yield  # pragma: no cover - makes this a generator
+
+        def accepted_stream():
+            yield SimpleNamespace(text='Keep ')
+            free = service._request_slots.acquire(blocking=False)
+            if free:
+                service._request_slots.release()
+            slot_free_while_streaming.append(free)
+            yield SimpleNamespace(text='going!')
+
+        stream = MagicMock(side_effect=[rejected_stream(), accepted_stream()])
+        service.client = SimpleNamespace(models=SimpleNamespace(generate_content_stream=stream))
+
+        with patch('app.services.ai_service.time.sleep') as mock_sleep:
+            chunks = list(service._stream_gemini('busy prompt'))
+
+        self.assertEqual(chunks, ['Keep ', 'going!'])
+        self.assertEqual(stream.call_count, 2)
+        mock_sleep.assert_called_once_with(1.0)
+        self.assertEqual(slot_free_while_streaming, [True])
+        self.assertTrue(service._request_slots.acquire(blocking=False))
+
+    def test_stalled_reader_does_not_hold_a_request_slot(self) -> None:
+        service = AIService()
+        service._gemini_model = True
+        service._request_slots = threading.BoundedSemaphore(1)
+        stream = MagicMock(return_value=iter([SimpleNamespace(text='One'), SimpleNamespace(text='Two')]))
+        service.client = SimpleNamespace(models=SimpleNamespace(generate_content_stream=stream))
+
+        chunks = service._stream_gemini('prompt')
+        self.assertEqual(next(chunks), 'One')
+
+        # The client has stopped reading, but other calls can still get a slot.
+        self.assertTrue(service._request_slots.acquire(blocking=False))
+
+    def test_failure_after_the_first_chunk_is_raised(self) -> None:
+        service = AIService()
+        service._gemini_model = True
+
+        def broken_stream():
+            yield SimpleNamespace(text='Half a ')
+            raise ConnectionError('reset by peer')
+
+        stream = MagicMock(return_value=broken_stream())
+        service.client = SimpleNamespace(models=SimpleNamespace(generate_content_stream=stream))
+
+        chunks = service._stream_gemini('prompt')
+        self.assertEqual(next(chunks), 'Half a ')
+        with self.assertRaises(ConnectionError):
+            next(chunks)
+
+    def test_other_errors_are_not_retried(self) -> None:
+        service = AIService()
+        service._gemini_model = True
+        generate = MagicMock(side_effect=ValueError('bad request'))
+        service.client = SimpleNamespace(models=SimpleNamespace(generate_content=generate))
+
+        with patch('app.services.ai_service.time.sleep') as mock_sleep:
+            self.assertEqual(service._call_gemini('bad prompt'), '')
+
+        generate.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    def test_concurrent_identical_prompts_share_one_request(self) -> None:
+        service = AIService()
+        service._gemini_model = True
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_generate(**_kwargs):
+            started.set()
+            release.wait(5)
+            return SimpleNamespace(text='Shared reply')
+
+        joined = threading.Event()
+
+        class _Flights(dict):
+            def get(self, key, default=None):
+                flight = super().get(key, default)
+                if flight is not None:
+                    joined.set()
+                return flight
+
+        generate = MagicMock(side_effect=slow_generate)
+        service.client = SimpleNamespace(models=SimpleNamespace(generate_content=generate))
+        service._inflight = _Flights()
+
+        replies: List[str] = []
+        leader = threading.Thread(target=lambda: replies.append(service._call_gemini('same prompt')))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: replies.append(service._call_gemini('same prompt')))
+        follower.start()
+        joined.wait(5)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(replies, ['Shared reply', 'Shared reply'])
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(service._inflight, {})
+
+
+class AIServicePlanParsingTests(TestCase):
+    def setUp(self) -> None:
+        self.service = AIService()
+
+    def test_plan_json_parses_with_or_without_fences(self) -> None:
+        payload = '{"overview": {"focus": "mobility"}, "habits": {"morning": "stretch"}}'
+
+        for raw in (payload, f'```json\n{payload}\n```', f'Here is your plan: {payload} Enjoy!'):
+            plan = self.service._parse_plan_response(raw)
+            self.assertEqual(plan['overview']['focus'], 'mobility')
+            self.assertEqual(plan['habits'], {'morning': 'stretch'})
+
+        self.assertIsNone(self.service._parse_plan_response('no plan here'))
+
+    def test_trailing_braces_after_the_plan_are_ignored(self) -> None:
+        raw = 'Plan: {"overview": {"focus": "strength"}} Tip: swap {any} lift you dislike.'
+
+        plan = self.service._parse_plan_response(raw)
+
+        self.assertEqual(plan['overview']['focus'], 'strength')
+
+    def test_fallback_plan_sections_follow_summary_cues(self) -> None:
+        self.service._gemini_model = False
+        conversation = [{'role': 'user', 'content': 'Vegetarian, training for Strength at home.'}]
+
+        plan = self.service.generate_plan(conversation, {'name': 'Sam'})
+
+        self.assertTrue(plan['workout']['weekly_split'].startswith('4-day split'))
+        self.assertTrue(plan['workout']['sample_session'].startswith('Circuit'))
+        self.assertTrue(plan['nutrition']['daily_structure'].startswith('Plate method'))
+
+
+class AIServiceSummaryTests(TestCase):
+    def test_summary_is_reused_for_an_unchanged_transcript(self) -> None:
+        service = AIService()
+        service._gemini_model = True
+        conversation = [{'role': 'user', 'content': 'I want to sleep better.'}]
+
+        with patch.object(service, '_call_gemini', return_value='Wants better sleep.') as mock_call:
+            self.assertEqual(service._summarize_conversation(conversation), 'Wants better sleep.')
+            self.assertEqual(service._summarize_conversation(list(conversation)), 'Wants better sleep.')
+            self.assertEqual(mock_call.call_count, 1)
+
+            service._summarize_conversation(conversation + [{'role': 'user', 'content': 'And lift.'}])
+            self.assertEqual(mock_call.call_count, 2)
+
+        # The new turn is folded into the cached summary instead of re-sending the transcript.
+        prompt = mock_call.call_args[0][0]
+        self.assertIn('Summary of our earlier chat: Wants better sleep.', prompt)
+        self.assertIn('User: And lift.', prompt)
+        self.assertNotIn('I want to sleep better.', prompt)
@@ -95,6 +95,58 @@ class DashboardRangeApiTests(TestCase):
             with app.test_client() as client:
                 response = client.get("/api/dashboard_range")
 
-            # login_required decorator issues a redirect when the session is missing
+            # the blueprint login guard issues a redirect when the session is missing
             self.assertEqual(302, response.status_code)
             self.assertIn("/login", response.location)
+
+    def test_dashboard_stats_totals_count_this_week_only(self):
+        with TemporaryDirectory() as tmpdir:
+            app, storage = self._build_app(tmpdir)
+            user_id = "user-1"
+            today = datetime.now(timezone.utc).date().isoformat()
+
+            for record_id, date_inferred in ((1, today), (2, "2000-01-01")):
+                storage.upsert_normalized_record(
+                    "workouts",
+                    {"id": record_id, "user_id": user_id, "progress_log_id": record_id, "date_inferred": date_inferred},
+                    on_conflict="id",
+                )
+            storage.upsert_normalized_record(
+                "sleep",
+                {"id": 3, "user_id": user_id, "progress_log_id": 3, "date_inferred": today, "time_asleep": "7.5h"},
+                on_conflict="id",
+            )
+
+            with app.app_context():
+                stats, trend = routes._derive_dashboard_stats(user_id)
+
+            self.assertEqual(1, stats["total_workouts"])
+            self.assertEqual(0, stats["total_meals"])
+            self.assertEqual(320, stats["calories_burned"])
+            self.assertEqual(7.5, stats["hours_sleep"])
+            self.assertTrue(stats["has_data"])
+            self.assertEqual(7, len(trend))
+
+    def test_dashboard_revalidates_with_etag(self):
+        with TemporaryDirectory() as tmpdir:
+            app, storage = self._build_app(tmpdir)
+            user_id = "user-1"
+            storage.save_plan(user_id, {"overview": {"focus": "Strength"}, "workout": {}, "nutrition": {}, "habits": {}})
+
+            with app.test_client() as client:
+                with client.session_transaction() as session:
+                    session["user"] = {"id": user_id, "email": "user@example.com", "onboarding_complete": True}
+
+                first = client.get("/dashboard")
+                etag = first.headers["ETag"]
+                cached = client.get("/dashboard", headers={"If-None-Match": etag})
+
+                storage.save_plan(user_id, {"overview": {"focus": "Endurance"}, "workout": {}, "nutrition": {}, "habits": {}})
+                changed = client.get("/dashboard", headers={"If-None-Match": etag})
+
+            self.assertEqual(200, first.status_code)
+            self.assertIn("private", first.headers["Cache-Control"])
+            self.assertEqual(304, cached.status_code)
+            self.assertEqual(b"", cached.data)
+            self.assertEqual(200, changed.status_code)
+            self.assertNotEqual(etag, changed.headers["ETag"])
@@ -21,3 +21,15 @@ class OfflineRouteTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"You're offline", response.data)
         self.assertIn(b'Retry connection', response.data)
+
+    def test_protected_routes_require_login(self) -> None:
+        page = self.client.get('/dashboard')
+        self.assertEqual(page.status_code, 302)
+        self.assertIn('/login', page.location)
+
+        api = self.client.get('/api/weekly_prompt')
+        self.assertEqual(api.status_code, 401)
+        self.assertEqual(api.get_json(), {'error': 'Unauthorized'})
+
+        self.assertEqual(self.client.get('/login').status_code, 200)
+        self.assertEqual(self.client.get('/missing-page').status_code, 404)
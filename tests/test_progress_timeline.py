@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import os
+import threading
 from datetime import datetime, timezone
+from unittest.mock import patch
 
 import app.routes as routes
+from app import create_app
+from app.services.storage_service import StorageService
 
 
 def test_progress_timeline_includes_calories_and_macros() -> None:
@@ -32,3 +37,78 @@ def test_progress_timeline_includes_calories_and_macros() -> None:
     assert compatible["macros"] == "P55/C60/F14"
     assert "Lunch bowl" in compatible["meals"]
     assert "Protein shake" in compatible["meals"]
+
+
+def test_progress_post_interprets_sections_concurrently(tmp_path) -> None:
+    with patch.dict(os.environ, {"STORAGE_DATA_DIR": str(tmp_path)}, clear=False):
+        storage = StorageService()
+    with patch.object(routes, "storage_service", storage):
+        app = create_app()
+    app.config["TESTING"] = True
+    app.storage_service = storage
+    app.health_ingestion = None
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session["user"] = {"id": "user-log", "name": "Sam", "onboarding_complete": True}
+
+    # Every interpreter waits for the other two, so a sequential route would break the barrier.
+    barrier = threading.Barrier(3, timeout=5)
+
+    def interpreted(result):
+        def _call(_text):
+            barrier.wait()
+            return result
+
+        return _call
+
+    ai = routes.ai_service
+    with (
+        patch.object(ai, "estimate_meal_calories", side_effect=interpreted({"calories": 640})),
+        patch.object(ai, "interpret_workout_log", side_effect=interpreted({"duration_min": 45})),
+        patch.object(ai, "interpret_sleep_log", side_effect=interpreted({"duration_hr": 7.5})),
+    ):
+        response = client.post(
+            "/progress",
+            data={"meals": "Chicken and rice", "workout": "Ran 5k", "sleep": "Slept 7.5h"},
+        )
+
+    assert response.status_code == 302
+    log = storage.fetch_logs("user-log")[-1]
+    assert log["meals_log"][0]["calories"] == 640
+    assert log["workouts_log"][0]["duration_min"] == 45
+    assert log["sleep_log"][0]["duration_hr"] == 7.5
+
+
+def test_replan_loads_plan_logs_and_conversation_concurrently(tmp_path) -> None:
+    with patch.dict(os.environ, {"STORAGE_DATA_DIR": str(tmp_path)}, clear=False):
+        storage = StorageService()
+    with patch.object(routes, "storage_service", storage):
+        app = create_app()
+    app.config["TESTING"] = True
+    app.storage_service = storage
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session["user"] = {"id": "user-replan", "name": "Sam", "onboarding_complete": True}
+
+    barrier = threading.Barrier(3, timeout=5)
+
+    def loaded(result):
+        def _call(_user_id):
+            barrier.wait()
+            return result
+
+        return _call
+
+    plan = {"overview": {"focus": "strength"}}
+    with (
+        patch.object(storage, "fetch_plan", side_effect=loaded(plan)),
+        patch.object(storage, "fetch_logs", side_effect=loaded([{"workout": "Ran 5k"}])),
+        patch.object(storage, "fetch_conversation", side_effect=loaded([])),
+        patch.object(routes.ai_service, "regenerate_plan", return_value=plan) as mock_replan,
+    ):
+        response = client.post("/replan")
+
+    assert response.status_code == 302
+    mock_replan.assert_called_once_with(
+        plan, [{"workout": "Ran 5k"}], [], {"id": "user-replan", "name": "Sam", "onboarding_complete": True}
+    )
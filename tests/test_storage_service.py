@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import os
+import threading
+import time
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from types import SimpleNamespace
 from unittest import TestCase
 from unittest.mock import patch
@@ -58,3 +61,147 @@ class StorageServiceConfigTests(TestCase):
 
         self.assertEqual("https://secret.example.com", config["url"])
         self.assertEqual("anon-secret", config["anon_key"])
+
+
+class StorageServiceWeeklyPromptTests(TestCase):
+    def test_weekly_prompt_reflects_logs_written_by_another_instance(self) -> None:
+        with TemporaryDirectory() as tmpdir:
+            with patch.dict(os.environ, {"STORAGE_DATA_DIR": tmpdir}, clear=False):
+                reader = StorageService()
+                writer = StorageService()
+
+            before = reader.get_weekly_prompt("user@example.com")
+            writer.append_log("user@example.com", {"timestamp": "2024-01-01T08:00:00Z", "workouts": []})
+            after = reader.get_weekly_prompt("user@example.com")
+
+        self.assertNotIn("2024-01-01T08:00:00Z", before)
+        self.assertIn("2024-01-01T08:00:00Z", after)
+
+    def test_dashboard_bundle_reuses_fetched_logs_for_prompt(self) -> None:
+        with TemporaryDirectory() as tmpdir:
+            with patch.dict(os.environ, {"STORAGE_DATA_DIR": tmpdir}, clear=False):
+                service = StorageService()
+            service.save_plan("user@example.com", {"plan": "strength"})
+
+            with patch.object(service, "fetch_logs", wraps=service.fetch_logs) as mock_fetch:
+                bundle = service.fetch_dashboard_bundle("user@example.com")
+
+            self.assertEqual({"plan": "strength"}, bundle["plan"])
+            self.assertEqual([], bundle["logs"])
+            self.assertTrue(bundle["weekly_prompt"])
+            self.assertEqual(mock_fetch.call_count, 1)
+
+
+class StorageServiceConversationTests(TestCase):
+    def test_coach_turn_skips_fallback_write_after_supabase_upsert(self) -> None:
+        upserts = []
+
+        class _FakeTable:
+            def upsert(self, payload):
+                upserts.append(payload)
+                return self
+
+            def execute(self):
+                return SimpleNamespace(data=[])
+
+        fake_supabase = SimpleNamespace(table=lambda name: _FakeTable())
+
+        with TemporaryDirectory() as tmpdir:
+            with patch.dict(os.environ, {"STORAGE_DATA_DIR": tmpdir}, clear=False):
+                service = StorageService()
+            service._supabase = fake_supabase
+
+            with patch.object(service, "_write_json") as mock_write:
+                service.save_coach_conversation("user@example.com", [{"role": "user", "content": "hi"}])
+
+        self.assertEqual(1, len(upserts))
+        self.assertEqual("coach", upserts[0]["conversation_type"])
+        mock_write.assert_not_called()
+
+
+    def test_coach_summary_round_trips_through_supabase(self) -> None:
+        rows = []
+        filters = []
+
+        class _FakeTable:
+            def upsert(self, payload):
+                rows.append(payload)
+                return self
+
+            def select(self, columns):
+                return self
+
+            def eq(self, column, value):
+                filters.append((column, value))
+                return self
+
+            def order(self, column, desc=False):
+                return self
+
+            def limit(self, count):
+                return self
+
+            def execute(self):
+                matching = [row for row in rows if all(row.get(column) == value for column, value in filters)]
+                return SimpleNamespace(data=matching[-1:])
+
+        fake_supabase = SimpleNamespace(table=lambda name: _FakeTable())
+
+        with TemporaryDirectory() as tmpdir:
+            with patch.dict(os.environ, {"STORAGE_DATA_DIR": tmpdir}, clear=False):
+                service = StorageService()
+            service._supabase = fake_supabase
+
+            with patch.object(service, "_write_json") as mock_write, patch.object(service, "_read_json") as mock_read:
+                service.save_coach_summary("user@example.com", {"turns": 12, "summary": "Training for a 10k."})
+                summary = service.fetch_coach_summary("user@example.com")
+
+        self.assertEqual({"turns": 12, "summary": "Training for a 10k."}, summary)
+        self.assertEqual("coach_summary", rows[0]["conversation_type"])
+        self.assertIn(("conversation_type", "coach_summary"), filters)
+        mock_write.assert_not_called()
+        mock_read.assert_not_called()
+
+
+class StorageServiceVisualizationTests(TestCase):
+    def test_concurrent_metadata_writes_do_not_lose_updates(self) -> None:
+        with TemporaryDirectory() as tmpdir:
+            with patch.dict(os.environ, {"STORAGE_DATA_DIR": tmpdir}, clear=False):
+                service = StorageService()
+            service._supabase = None
+            service._redis = None
+            user_id = "user-viz"
+            service.record_visualization_metadata(user_id, {"id": "viz-0", "status": "pending"})
+
+            load = service._load_visualizations
+
+            def slow_load(uid):
+                entries = load(uid)
+                time.sleep(0.01)  # widen the read-modify-write window
+                return entries
+
+            threads = [
+                threading.Thread(
+                    target=service.record_visualization_metadata,
+                    args=(user_id, {"id": f"viz-{index}", "status": "pending"}),
+                )
+                for index in range(1, 6)
+            ]
+            threads.append(
+                threading.Thread(
+                    target=service.update_visualization_metadata,
+                    args=(user_id, "viz-0", {"status": "ready"}),
+                )
+            )
+            threads.append(threading.Thread(target=service.remove_visualization, args=(user_id, "viz-missing")))
+
+            with patch.object(service, "_load_visualizations", side_effect=slow_load):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join(5)
+
+            entries = {entry["id"]: entry["status"] for entry in service._load_visualizations(user_id)}
+
+        self.assertEqual(sorted(entries), [f"viz-{index}" for index in range(6)])
+        self.assertEqual(entries["viz-0"], "ready")
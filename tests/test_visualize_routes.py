@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import app.routes as routes
+from app import create_app
+from app.services.storage_service import StorageService
+from app.services.visualization_worker import VisualizationWorker
+
+
+class VisualizeRouteTests(TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = TemporaryDirectory()
+        with patch.dict(os.environ, {'STORAGE_DATA_DIR': self._tmpdir.name}, clear=False):
+            self.storage = StorageService()
+
+        with patch.object(routes, 'storage_service', self.storage):
+            self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.storage_service = self.storage
+        self.app.visualization_worker = VisualizationWorker(self.storage, routes.ai_service)
+        self.client = self.app.test_client()
+        self.user = {'id': 'user-viz', 'name': 'Jordan', 'onboarding_complete': True}
+
+        with self.client.session_transaction() as flask_session:
+            flask_session['user'] = self.user
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_user_image_is_served_with_immutable_cache_headers(self) -> None:
+        directory = self.storage.user_images_dir(self.user['id'])
+        (directory / 'abc123.png').write_bytes(b'png-bytes')
+
+        response = self.client.get(f"/user-images/{self.user['id']}/abc123.png")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'png-bytes')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+        self.assertIsNotNone(response.headers.get('ETag'))
+
+        cached = self.client.get(
+            f"/user-images/{self.user['id']}/abc123.png",
+            headers={'If-None-Match': response.headers['ETag']},
+        )
+        self.assertEqual(cached.status_code, 304)
+
+    def test_upload_is_streamed_to_its_final_location(self) -> None:
+        with patch.object(routes.ai_service, 'generate_visualization', return_value=b'future-bytes') as mock_generate:
+            response = self.client.post(
+                '/visualize',
+                data={'photo': (io.BytesIO(b'original-bytes'), 'me.png'), 'goal_type': 'Stronger'},
+                content_type='multipart/form-data',
+            )
+            self.app.visualization_worker.join()
+
+        self.assertEqual(response.status_code, 302)
+        source_path = mock_generate.call_args[0][0]
+        self.assertEqual(source_path.read_bytes(), b'original-bytes')
+
+        entries = self.storage.list_visualizations(self.user['id'])
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['status'], 'ready')
+        self.assertEqual(entries[0]['original_storage_path'], str(source_path))
+        directory = self.storage.user_images_dir(self.user['id'])
+        self.assertEqual(len(list(directory.iterdir())), 2)
+
+    def test_failed_generation_reuses_the_original_without_copying(self) -> None:
+        with patch.object(routes.ai_service, 'generate_visualization', return_value=None):
+            self.client.post(
+                '/visualize',
+                data={'photo': (io.BytesIO(b'original-bytes'), 'me.png')},
+                content_type='multipart/form-data',
+            )
+            self.app.visualization_worker.join()
+
+        entry = self.storage.list_visualizations(self.user['id'])[0]
+        self.assertEqual(entry['status'], 'ready')
+        self.assertEqual(entry['storage_path'], entry['original_storage_path'])
+        self.assertEqual(entry['url'], entry['original_url'])
+        directory = self.storage.user_images_dir(self.user['id'])
+        self.assertEqual(len(list(directory.iterdir())), 1)
+
+    def test_empty_upload_leaves_no_files_behind(self) -> None:
+        with patch.object(routes.ai_service, 'generate_visualization') as mock_generate:
+            response = self.client.post(
+                '/visualize',
+                data={'photo': (io.BytesIO(b''), 'me.jpg')},
+                content_type='multipart/form-data',
+            )
+
+        self.assertEqual(response.status_code, 302)
+        mock_generate.assert_not_called()
+        directory = self.storage.user_images_dir(self.user['id'])
+        self.assertEqual(list(directory.iterdir()), [])
+
+    def test_status_endpoint_reports_pending_until_worker_finishes(self) -> None:
+        self.storage.record_visualization_metadata(self.user['id'], {'id': 'viz-1', 'status': 'pending'})
+
+        pending = self.client.get('/visualize/status/viz-1')
+        self.assertEqual(pending.status_code, 200)
+        self.assertEqual(pending.get_json()['status'], 'pending')
+
+        self.storage.update_visualization_metadata(
+            self.user['id'], 'viz-1', {'status': 'ready', 'url': '/user-images/user-viz/done.png'}
+        )
+        ready = self.client.get('/visualize/status/viz-1').get_json()
+        self.assertEqual(ready['status'], 'ready')
+        self.assertEqual(ready['url'], '/user-images/user-viz/done.png')
+
+        missing = self.client.get('/visualize/status/unknown')
+        self.assertEqual(missing.status_code, 404)
+
+    def test_status_endpoint_returns_json_401_when_logged_out(self) -> None:
+        with self.client.session_transaction() as flask_session:
+            flask_session.clear()
+
+        response = self.client.get('/visualize/status/viz-1')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.get_json(), {'error': 'Unauthorized'})
+        with self.client.session_transaction() as flask_session:
+            self.assertNotIn('_flashes', flask_session)
+
+    def test_stale_pending_entry_is_reported_and_stored_as_failed(self) -> None:
+        created_at = (datetime.now(timezone.utc) - timedelta(minutes=30)).isoformat()
+        self.storage.record_visualization_metadata(
+            self.user['id'], {'id': 'viz-old', 'status': 'pending', 'created_at': created_at}
+        )
+
+        response = self.client.get('/visualize/status/viz-old')
+
+        self.assertEqual(response.get_json()['status'], 'failed')
+        self.assertEqual(self.storage.get_visualization(self.user['id'], 'viz-old')['status'], 'failed')
+
+    def test_process_marks_entry_failed_when_an_update_raises(self) -> None:
+        self.storage.record_visualization_metadata(self.user['id'], {'id': 'viz-3', 'status': 'pending'})
+        original = self.storage.save_visualization_image(self.user['id'], b'original', ext='jpg')
+        worker = VisualizationWorker(self.storage, routes.ai_service)
+
+        with patch.object(routes.ai_service, 'generate_visualization', return_value=None), patch.object(
+            self.storage, 'update_visualization_metadata', side_effect=[RuntimeError('disk full'), None]
+        ) as mock_update:
+            worker.process({'id': 'viz-3', 'user_id': self.user['id'], 'original_path': original['path']})
+
+        self.assertEqual(mock_update.call_args[0], (self.user['id'], 'viz-3', {'status': 'failed'}))
+
+    def test_serverless_runtime_generates_visualizations_inline(self) -> None:
+        with patch.dict(os.environ, {'VERCEL': '1'}, clear=False), patch.object(routes, 'storage_service', self.storage):
+            app = create_app()
+
+        self.assertIsNone(app.visualization_worker)
+
+    def test_delete_removes_all_visualization_files(self) -> None:
+        directory = self.storage.user_images_dir(self.user['id'])
+        original = self.storage.save_visualization_image(self.user['id'], b'original', ext='jpg')
+        future = self.storage.save_visualization_image(self.user['id'], b'future', ext='png')
+        (directory / 'unrelated.png').write_bytes(b'keep')
+        self.storage.record_visualization_metadata(
+            self.user['id'],
+            {
+                'id': 'viz-2',
+                'status': 'ready',
+                'storage_path': future['path'],
+                'original_storage_path': original['path'],
+            },
+        )
+
+        # The file names are known, so no directory listing is needed.
+        with patch('os.scandir', side_effect=AssertionError('directory was listed')):
+            response = self.client.post('/visualize/viz-2/delete')
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(p.name for p in directory.iterdir()), ['unrelated.png'])
+        self.assertEqual(self.storage.list_visualizations(self.user['id']), [])
+
+    def test_legacy_filename_entries_are_deleted(self) -> None:
+        directory = self.storage.user_images_dir(self.user['id'])
+        future = self.storage.save_visualization_image(self.user['id'], b'future', ext='png')
+        entry = {'storage_path': future['path'], 'future': Path(future['path']).name, 'original': 'gone.jpg'}
+
+        deleted = self.storage.delete_visualization_files(self.user['id'], entry)
+
+        self.assertEqual(deleted, 1)
+        self.assertEqual(list(directory.iterdir()), [])